@@ -0,0 +1,11 @@
+file(REMOVE_RECURSE
+  "../../physics_core.cpython-311-x86_64-linux-gnu.so"
+  "../../physics_core.pdb"
+  "CMakeFiles/physics_core.dir/simulator.cpp.o"
+  "CMakeFiles/physics_core.dir/simulator.cpp.o.d"
+)
+
+# Per-language clean rules from dependency scanning.
+foreach(lang CXX)
+  include(CMakeFiles/physics_core.dir/cmake_clean_${lang}.cmake OPTIONAL)
+endforeach()
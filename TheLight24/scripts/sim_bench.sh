@@ -1,9 +1,10 @@
 #!/bin/bash
-# Headless runner: carica scenario, integra per N step, salva snapshot periodici
+# Headless runner: carica scenario, integra per N step, registra la traiettoria e l'ultimo snapshot
 set -e
 ROOT="$(cd "$(dirname "$0")/.." && pwd)"
 cd "$ROOT"
 source .venv/bin/activate
+mkdir -p data/runtime
 
 PY=$(cat <<'PYCODE'
 import json, time
@@ -11,6 +12,8 @@ from src.sim.universe import Universe
 
 U=Universe()
 U.load_from_json("src/sim/scenarios/solar_system_min.json")
+# un frame ogni 10 step (+ iniziale): rileggibile con TrajectoryReader o /sim/replay
+U.record("data/runtime/trajectory.npy", capacity=31, stride=10)
 
 for i in range(300):
     dt=U.step()
@@ -18,6 +21,7 @@ for i in range(300):
         snap=U.snapshot(2000)
         with open("data/runtime/last_snapshot.json","w",encoding="utf-8") as f:
             json.dump(snap,f)
+U.stop_recording()
 print("OK")
 PYCODE
 )
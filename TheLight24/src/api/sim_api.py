@@ -1,29 +1,259 @@
 # FastAPI router per Universe_SIM
-from fastapi import APIRouter, HTTPException, Query
+from contextlib import contextmanager
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
-from ..sim.universe import Universe
-import os
+from ..sim.universe import frame_to_json
+from ..sim.trajectory import TrajectoryReader
+from ..sim.sessions import SessionHost, SessionRegistry, SessionLimitError
+from ..sim import wire
+from ..sim.stream import StreamEncoder
+import asyncio, json, os, re
 
 router = APIRouter(prefix="/sim", tags=["simulation"])
-UNIVERSE = Universe()
+HOST = SessionHost()            # sessione predefinita (senza ?session=), nel processo del server
+UNIVERSE = HOST.universe
+RUNNER = HOST.runner            # thread di integrazione: le modifiche a UNIVERSE passano da RUNNER.apply
+CHECKPOINT_DIR = os.path.join("data", "runtime", "checkpoints")
+TRAJECTORY_DIR = os.path.join("data", "runtime", "trajectories")
+SESSION_DIR = os.path.join("data", "runtime", "sessions")
+MAX_SESSIONS = 8
+MAX_PARTICLES = 2_000_000
+MAX_STREAM_FPS = 60.0
+REGISTRY = SessionRegistry(SESSION_DIR, MAX_SESSIONS, MAX_PARTICLES)
+
+def _runtime_path(folder, name, ext):
+    if not re.fullmatch(r"[\w.-]+", name):
+        raise HTTPException(400, f"Nome non valido: {name}")
+    return os.path.join(folder, name if name.endswith(ext) else name + ext)
+
+def _status(e):
+    # codice HTTP delle eccezioni attese del dominio, None per le altre
+    if isinstance(e, (SessionLimitError, ImportError)):
+        return 503
+    if isinstance(e, ValueError):
+        return 400
+    if isinstance(e, RuntimeError):
+        return 409
+    return None
+
+@contextmanager
+def _errors():
+    try:
+        yield
+    except Exception as e:
+        code = _status(e)
+        if code is None:
+            raise
+        raise HTTPException(code, str(e))
+
+def _ndjson(progress):
+    # a stream avviato lo stato HTTP è già inviato: un errore diventa l'ultima riga
+    try:
+        for p in progress:
+            yield json.dumps(p) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e), "status": _status(e) or 500, "done": True}) + "\n"
+
+def _host(session):
+    # ?session=<chiave>: Universe dedicato in un processo worker (creato o ripreso al primo accesso)
+    if session is None:
+        return HOST
+    with _errors():
+        return REGISTRY.get(session)
 
 @router.post("/load")
-def load(scenario: str):
+def load(scenario: str, backend: Optional[str] = Query(None, pattern="^(numpy|native)$"),
+         session: Optional[str] = Query(None)):
     path = os.path.join("src","sim","scenarios", scenario)
     if not os.path.exists(path):
         raise HTTPException(404, f"Scenario non trovato: {scenario}")
-    UNIVERSE.load_from_json(path)
-    return {"ok": True, "scenario": scenario}
+    host = _host(session)
+    with _errors():
+        r = host.load(path, backend)
+        if session is not None:
+            REGISTRY.admit(session)
+    return {"ok": True, "scenario": scenario, "backend": r["backend"]}
 
 @router.post("/step")
-def step(dt: Optional[float] = Query(None)):
-    used = UNIVERSE.step(dt)
-    return {"ok": True, "dt_used": used, "t": UNIVERSE.t}
+def step(dt: Optional[float] = Query(None, gt=0), steps: Optional[int] = Query(None, ge=1),
+         until_t: Optional[float] = Query(None), stream: bool = Query(False),
+         every: int = Query(1000, ge=1), session: Optional[str] = Query(None)):
+    # più passi lato server: fino a `steps` e/o fino a t = until_t; stream=true -> NDJSON ogni `every` passi
+    host = _host(session)
+    with _errors():
+        progress = host.advance(steps, until_t, dt, every)
+    if stream:
+        # close() anche a client disconnesso: libera la sessione pure se lo stream non è partito
+        return StreamingResponse(_ndjson(progress), media_type="application/x-ndjson",
+                                 background=BackgroundTask(progress.close))
+    with _errors():
+        for last in progress:
+            pass
+    return {"ok": True, "dt_used": last["dt_last"] or 0.0, **last}
 
 @router.get("/snapshot")
-def snapshot(n: Optional[int] = Query(None)):
-    return UNIVERSE.snapshot(max_particles=n)
+def snapshot(request: Request, n: Optional[int] = Query(None), session: Optional[str] = Query(None),
+             fields: Optional[str] = Query(None), dtype: str = Query("float32", pattern="^float(32|64)$")):
+    # frame pubblicato dal runner (anche per le sessioni, senza attendere un /sim/step in corso)
+    # Accept: application/octet-stream -> formato binario di src/sim/wire.py (dtype solo per il binario)
+    host = _host(session)
+    with _errors():
+        names = wire.parse_fields(fields)
+        frame = host.frame()
+    if wire.MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(wire.encode(frame, names, dtype, max_particles=n), media_type=wire.MEDIA_TYPE)
+    return frame_to_json(frame, max_particles=n, fields=names)
+
+@router.websocket("/stream")
+async def stream(ws: WebSocket, fps: float = Query(10.0, gt=0), n: Optional[int] = Query(None, ge=1),
+                 session: Optional[str] = Query(None), keyframe_every: int = Query(50, ge=1)):
+    """
+    Posizioni quantizzate (src/sim/stream.py) a `fps` frame/s, solo se t è cambiato.
+    Messaggi dal client: {"fps": x} cambia la frequenza, {"keyframe": true} forza un keyframe.
+    Backpressure: un solo messaggio in coda per client; se l'invio precedente non è concluso
+    il frame viene scartato prima della codifica (i delta restano coerenti con quanto ricevuto).
+    """
+    await ws.accept()
+    try:
+        host = await run_in_threadpool(_host, session)
+    except HTTPException as e:
+        await ws.close(code=1008, reason=str(e.detail))
+        return
+    enc = StreamEncoder(keyframe_every)
+    state = {"fps": min(fps, MAX_STREAM_FPS), "dropped": 0, "last_t": None}
+    out = asyncio.Queue(maxsize=1)
+
+    async def sender():
+        while True:
+            await ws.send_bytes(await out.get())
+
+    async def receiver():
+        while True:
+            msg = await ws.receive_json()
+            if isinstance(msg.get("fps"), (int, float)) and msg["fps"] > 0:
+                state["fps"] = min(float(msg["fps"]), MAX_STREAM_FPS)
+            if msg.get("keyframe"):
+                enc.force_keyframe()
+                state["last_t"] = None      # inviato anche a simulazione ferma
+
+    loop = asyncio.get_running_loop()
+    tasks = [asyncio.create_task(sender()), asyncio.create_task(receiver())]
+    try:
+        while not any(t.done() for t in tasks):
+            tick = loop.time()
+            if out.full():
+                state["dropped"] += 1
+            else:
+                frame = await run_in_threadpool(host.frame)
+                if frame and frame["t"] != state["last_t"]:
+                    pos = frame["pos"] if n is None else frame["pos"][:n]
+                    out.put_nowait(enc.encode(pos, frame["t"], state["dropped"]))
+                    state["last_t"] = frame["t"]
+            await asyncio.sleep(max(0.0, 1.0/state["fps"] - (loop.time() - tick)))
+    finally:
+        for t in tasks:
+            t.cancel()
+        # disconnessione o errore di invio: chiude il ciclo senza propagare
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 @router.get("/status")
-def status():
-    return {"t": UNIVERSE.t, "loaded": UNIVERSE.core is not None}
+def status(session: Optional[str] = Query(None)):
+    return _host(session).status()
+
+@router.post("/run")
+def run(rate: Optional[float] = Query(None, ge=0), dt: Optional[float] = Query(None, gt=0),
+        session: Optional[str] = Query(None)):
+    host = _host(session)
+    with _errors():
+        return {"ok": True, **host.run(rate, dt)}
+
+@router.post("/pause")
+def pause(session: Optional[str] = Query(None)):
+    return {"ok": True, **_host(session).pause()}
+
+@router.post("/rate")
+def rate(rate: float = Query(..., ge=0), session: Optional[str] = Query(None)):
+    return {"ok": True, **_host(session).set_rate(rate)}
+
+@router.post("/checkpoint")
+def checkpoint(name: str = Query("latest"), session: Optional[str] = Query(None)):
+    path = _runtime_path(CHECKPOINT_DIR, name, ".npz")
+    host = _host(session)
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    with _errors():
+        r = host.save_checkpoint(path)
+    return {"ok": True, "checkpoint": os.path.basename(path), **r}
+
+@router.post("/restore")
+def restore(name: str = Query("latest"), session: Optional[str] = Query(None)):
+    path = _runtime_path(CHECKPOINT_DIR, name, ".npz")
+    if not os.path.exists(path):
+        raise HTTPException(404, f"Checkpoint non trovato: {name}")
+    host = _host(session)
+    with _errors():
+        r = host.load_checkpoint(path)
+        if session is not None:
+            REGISTRY.admit(session)
+    return {"ok": True, "checkpoint": os.path.basename(path), "t": r["t"], "N": r["N"]}
+
+@router.post("/record")
+def record(name: str = Query("trajectory"), capacity: int = Query(1000, ge=1), stride: int = Query(1, ge=1),
+           session: Optional[str] = Query(None)):
+    path = _runtime_path(TRAJECTORY_DIR, name, ".npy")
+    host = _host(session)
+    os.makedirs(TRAJECTORY_DIR, exist_ok=True)
+    with _errors():
+        host.record(path, capacity, stride)
+    return {"ok": True, "trajectory": os.path.basename(path), "capacity": capacity, "stride": stride}
+
+@router.post("/record/stop")
+def record_stop(session: Optional[str] = Query(None)):
+    return {"ok": True, "frames": _host(session).stop_recording()}
+
+@router.get("/replay")
+def replay(frame: int = Query(..., ge=0), name: Optional[str] = Query(None), n: Optional[int] = Query(None),
+           session: Optional[str] = Query(None)):
+    if name is not None:
+        path = _runtime_path(TRAJECTORY_DIR, name, ".npy")
+    else:
+        path = _host(session).recording_path()
+        if path is None:
+            raise HTTPException(404, "Nessuna traiettoria in registrazione")
+    if not os.path.exists(path):
+        raise HTTPException(404, f"Traiettoria non trovata: {name}")
+    try:
+        f = TrajectoryReader(path).frame(frame, max_particles=n)
+    except IndexError as e:
+        raise HTTPException(404, str(e))
+    f["pos"], f["vel"] = f["pos"].tolist(), f["vel"].tolist()
+    return f
+
+@router.get("/metrics")
+def metrics(session: Optional[str] = Query(None)):
+    return _host(session).metrics()
+
+@router.post("/metrics")
+def metrics_toggle(enabled: Optional[bool] = Query(None), reset: bool = Query(False),
+                   session: Optional[str] = Query(None)):
+    r = _host(session).metrics(enabled, reset)
+    return {"ok": True, "enabled": r["enabled"]}
+
+@router.get("/sessions")
+def sessions():
+    return REGISTRY.status()
+
+@router.post("/sessions")
+def sessions_limits(max_sessions: Optional[int] = Query(None, ge=1), max_particles: Optional[int] = Query(None, ge=1)):
+    REGISTRY.set_limits(max_sessions, max_particles)
+    return {"ok": True, **REGISTRY.status()}
+
+@router.delete("/session")
+def session_drop(session: str = Query(...)):
+    with _errors():
+        found = REGISTRY.drop(session)
+    if not found:
+        raise HTTPException(404, f"Sessione non trovata: {session}")
+    return {"ok": True, "session": session}
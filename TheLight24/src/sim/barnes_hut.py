@@ -0,0 +1,216 @@
+# TheLight24 v6 – Barnes–Hut octree (gravità + Coulomb), NumPy vettorizzato
+import numpy as np
+from .units import G_SI, K_SI
+
+MAX_DEPTH = 21          # 3*21 = 63 bit di chiave Morton
+CHUNK = 4096            # particelle bersaglio per passata di visita
+
+def _spread_bits(v):
+    # interleave a 3 vie: bit k di v -> bit 3k
+    v = v.astype(np.uint64) & np.uint64(0x1fffff)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    v = (v | (v << np.uint64(8)))  & np.uint64(0x100f00f00f00f00f)
+    v = (v | (v << np.uint64(4)))  & np.uint64(0x10c30c30c30c30c3)
+    v = (v | (v << np.uint64(2)))  & np.uint64(0x1249249249249249)
+    return v
+
+def _expand_ranges(start, count):
+    # concatena arange(start[k], start[k]+count[k]) per ogni k
+    total = int(count.sum())
+    owner = np.repeat(np.arange(count.size), count)
+    offs = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+    return owner, start[owner] + offs
+
+def _segment_sums(arr, start, end):
+    # somme esatte arr[start:end] per segmenti disgiunti e ordinati
+    pad = np.concatenate([arr, np.zeros((1,) + arr.shape[1:], dtype=arr.dtype)])
+    idx = np.column_stack([start, end]).ravel()
+    return np.add.reduceat(pad, idx, axis=0)[::2]
+
+class Octree:
+    """
+    Octree lineare costruito per livelli dalle chiavi Morton.
+    Ogni nodo copre un intervallo contiguo [start,end) delle particelle ordinate.
+    Monopoli: massa al centro di massa; cariche positive e negative separate, ognuna
+    nel proprio baricentro (una cella neutra conserva così il suo dipolo).
+    """
+    def __init__(self, pos, mass, charge, leaf_size=8):
+        pos = np.asarray(pos, dtype=np.float64)
+        N = pos.shape[0]
+        lo = pos.min(axis=0)
+        span = float(np.max(pos.max(axis=0) - lo))
+        span = span * (1.0 + 1e-9) if span > 0 else 1.0
+        cells = 1 << MAX_DEPTH
+        ic = np.minimum(((pos - lo) * (cells / span)).astype(np.int64), cells - 1)
+        keys = _spread_bits(ic[:,0]) | (_spread_bits(ic[:,1]) << np.uint64(1)) | (_spread_bits(ic[:,2]) << np.uint64(2))
+
+        self.order = np.argsort(keys, kind="stable")
+        keys = keys[self.order]
+        ic = ic[self.order]
+        self.pos = pos[self.order]
+        self.mass = np.asarray(mass, dtype=np.float64)[self.order]
+        self.charge = np.asarray(charge, dtype=np.float64)[self.order]
+        self.N = N
+
+        starts, ends, levels = [np.array([0])], [np.array([N])], [np.array([0])]
+        first_child = []
+        n_child = []
+        cur_s, cur_e = starts[0], ends[0]
+        base = 0   # id globale del primo nodo del livello corrente
+        for L in range(MAX_DEPTH):
+            split = np.flatnonzero(cur_e - cur_s > leaf_size)
+            fc = np.full(cur_s.size, -1, dtype=np.int64)
+            nc = np.zeros(cur_s.size, dtype=np.int64)
+            if split.size == 0:
+                first_child.append(fc); n_child.append(nc)
+                break
+            _, idx = _expand_ranges(cur_s[split], cur_e[split] - cur_s[split])
+            pk = keys[idx] >> np.uint64(3 * (MAX_DEPTH - L - 1))
+            brk = np.flatnonzero(pk[1:] != pk[:-1]) + 1
+            cs = idx[np.concatenate([[0], brk])]
+            ce = idx[np.concatenate([brk, [idx.size]]) - 1] + 1
+            parent = split[np.searchsorted(cur_s[split], cs, side="right") - 1]
+            counts = np.bincount(parent, minlength=cur_s.size)
+            child_ids = base + cur_s.size + np.arange(cs.size)
+            first = np.searchsorted(parent, split)
+            fc[split] = child_ids[first]
+            nc[split] = counts[split]
+            first_child.append(fc); n_child.append(nc)
+            base += cur_s.size
+            cur_s, cur_e = cs, ce
+            starts.append(cs); ends.append(ce); levels.append(np.full(cs.size, L + 1))
+        else:
+            first_child.append(np.full(cur_s.size, -1, dtype=np.int64))
+            n_child.append(np.zeros(cur_s.size, dtype=np.int64))
+
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        self.level = np.concatenate(levels)
+        self.first_child = np.concatenate(first_child)
+        self.n_child = np.concatenate(n_child)
+        self.leaf = self.n_child == 0
+
+        # geometria: cella intera al livello del nodo, ricavata dalla prima particella
+        width = span / (2.0 ** self.level)
+        cell = ic[self.start] >> (MAX_DEPTH - self.level)[:,None]
+        self.center = lo + (cell + 0.5) * width[:,None]
+        self.width = width
+
+        # momenti per livello (somme esatte su segmenti disgiunti)
+        M = np.empty(self.start.size); MX = np.empty((self.start.size, 3))
+        QP = np.empty(self.start.size); QPX = np.empty((self.start.size, 3))
+        QN = np.empty(self.start.size); QNX = np.empty((self.start.size, 3))
+        qp = np.maximum(self.charge, 0.0)
+        qn = np.minimum(self.charge, 0.0)
+        off = 0
+        for s, e in zip(starts, ends):
+            sl = slice(off, off + s.size)
+            M[sl] = _segment_sums(self.mass, s, e)
+            MX[sl] = _segment_sums(self.mass[:,None] * self.pos, s, e)
+            QP[sl] = _segment_sums(qp, s, e)
+            QPX[sl] = _segment_sums(qp[:,None] * self.pos, s, e)
+            QN[sl] = _segment_sums(qn, s, e)
+            QNX[sl] = _segment_sums(qn[:,None] * self.pos, s, e)
+            off += s.size
+        self.M = M
+        self.QP, self.QN = QP, QN
+        self.com = np.where(M[:,None] != 0, MX / np.where(M == 0, 1.0, M)[:,None], self.center)
+        self.qpcen = np.where(QP[:,None] > 0, QPX / np.where(QP == 0, 1.0, QP)[:,None], self.center)
+        self.qncen = np.where(QN[:,None] < 0, QNX / np.where(QN == 0, -1.0, QN)[:,None], self.center)
+
+    def forces(self, theta=0.5, softening=0.0, grav=True, coulomb=False, G=G_SI, K=K_SI,
+               targets=None, chunk=CHUNK, pot=None):
+        """
+        Forze sulle particelle `targets` (indici originali; tutte se None),
+        nello stesso ordine: (len(targets),3) oppure (N,3).
+        Un nodo che contiene il bersaglio non è mai approssimato (theta grandi compresi).
+        pot (array (1,)): accumula l'energia potenziale gravità+Coulomb dei bersagli con le
+        stesse approssimazioni (metà della somma per bersaglio: su tutti i bersagli è U).
+        """
+        x = self.pos
+        eps2 = softening**2
+        th2 = theta**2
+        if targets is None:
+            tgt = np.arange(self.N)
+            dest = self.order
+        else:
+            inv = np.empty(self.N, dtype=np.int64)
+            inv[self.order] = np.arange(self.N)
+            tgt = inv[np.asarray(targets)]
+            dest = np.argsort(tgt, kind="stable")
+            tgt = tgt[dest]         # visita in ordine Morton (località)
+        F = np.zeros((tgt.size, 3))
+        for c0 in range(0, tgt.size, chunk):
+            ti = tgt[c0:c0 + chunk]
+            n = ti.size
+            Fc = np.zeros((n, 3))
+            li = np.arange(n)       # posizione locale nel chunk
+            nd = np.zeros(n, dtype=np.int64)
+            while ti.size:
+                xi = x[ti]
+                dc = self.center[nd] - xi
+                d2 = np.einsum('ij,ij->i', dc, dc)
+                inside = (self.start[nd] <= ti) & (ti < self.end[nd])
+                accept = (self.width[nd]**2 < th2 * d2) & ~inside
+                direct = ~accept & self.leaf[nd]
+                opened = ~accept & ~self.leaf[nd]
+
+                # nodi lontani: monopolo
+                a, na, la = ti[accept], nd[accept], li[accept]
+                if a.size:
+                    f = np.zeros((a.size, 3))
+                    if grav:
+                        dx = self.com[na] - x[a]
+                        r2 = np.einsum('ij,ij->i', dx, dx) + eps2
+                        c = G * self.mass[a] * self.M[na]
+                        f += (c * r2**-1.5)[:,None] * dx
+                        if pot is not None:
+                            pot[0] -= 0.5 * np.sum(c * r2**-0.5)
+                    if coulomb:
+                        for Qs, cen in ((self.QP, self.qpcen), (self.QN, self.qncen)):
+                            dx = cen[na] - x[a]
+                            r2 = np.einsum('ij,ij->i', dx, dx) + eps2
+                            c = K * self.charge[a] * Qs[na]
+                            f += (c * r2**-1.5)[:,None] * dx
+                            if pot is not None:
+                                pot[0] -= 0.5 * np.sum(c * r2**-0.5)
+                    for c in range(3):
+                        Fc[:,c] += np.bincount(la, weights=f[:,c], minlength=n)
+
+                # foglie vicine: somma diretta
+                d, nd_d, ld = ti[direct], nd[direct], li[direct]
+                if d.size:
+                    owner, j = _expand_ranges(self.start[nd_d], self.end[nd_d] - self.start[nd_d])
+                    i, l = d[owner], ld[owner]
+                    keep = i != j
+                    i, j, l = i[keep], j[keep], l[keep]
+                    dx = x[j] - x[i]
+                    r2 = np.einsum('ij,ij->i', dx, dx) + eps2
+                    inv_r = r2**-0.5
+                    coef = np.zeros(i.size)
+                    if grav:
+                        coef += G * self.mass[i] * self.mass[j]
+                    if coulomb:
+                        coef += K * self.charge[i] * self.charge[j]
+                    if pot is not None:
+                        pot[0] -= 0.5 * np.sum(coef * inv_r)
+                    coef *= inv_r**3
+                    f = coef[:,None] * dx
+                    for c in range(3):
+                        Fc[:,c] += np.bincount(l, weights=f[:,c], minlength=n)
+
+                # nodi aperti: scendi ai figli
+                o, no, lo = ti[opened], nd[opened], li[opened]
+                owner, child = _expand_ranges(self.first_child[no], self.n_child[no])
+                ti, nd, li = o[owner], child, lo[owner]
+            F[dest[c0:c0 + n]] = Fc
+        return F
+
+def bh_forces(pos, mass, charge, cfg, rows=None, G=G_SI, K=K_SI, pot=None):
+    """Forze gravità/Coulomb con albero Barnes–Hut ricostruito a ogni valutazione."""
+    if pos.shape[0] < 2:
+        return np.zeros((pos.shape[0] if rows is None else len(rows), 3))
+    tree = Octree(pos, mass, charge, leaf_size=cfg.leaf_size)
+    return tree.forces(theta=cfg.theta, softening=cfg.softening,
+                       grav=cfg.grav, coulomb=cfg.coulomb, G=G, K=K, targets=rows, pot=pot)
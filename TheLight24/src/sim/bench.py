@@ -0,0 +1,154 @@
+# TheLight24 v6 – Benchmark fisica: passi/s e picco di memoria per backend × integratore × N, confronto con baseline
+# Uso: python -m src.sim.bench [--n 100 1000 10000 100000] [--baseline FILE] [--threshold 0.25] [--save-baseline]
+import argparse, json, os, platform, sys, time, tracemalloc, warnings
+import numpy as np
+from .physics_core import PhysicsCore, PhysicsConfig
+from .generators import plummer
+from .units import G_SI
+
+SIZES = (100, 1000, 10000, 100000)
+BACKENDS = {
+    # nome -> parametri PhysicsConfig del solver
+    "direct": dict(solver="direct"),
+    "tiled": dict(solver="tiled", symmetric=True),
+    "bh": dict(solver="bh", theta=0.5),
+    "pm": dict(solver="pm", pm_mesh=64, periodic=True),
+    "native": None,     # Simulator C++ (se compilato), integratore proprio
+}
+INTEGRATORS = ("rk4", "leapfrog", "yoshida4", "block")
+DIRECT_MAX_N = 4000     # (N,N,3) float64: oltre, memoria > ~400 MB
+# esponente di scala del costo per passo, per stimare il caso successivo
+SCALING = {"direct": 2.0, "tiled": 2.0, "bh": 1.2, "pm": 1.0, "native": 2.0}
+RESULTS_PATH = os.path.join("data", "runtime", "bench_results.json")
+BASELINE_PATH = os.path.join("data", "runtime", "bench_baseline.json")
+
+def _scenario(n, seed):
+    # sfera di Plummer di scala a=1 m e massa 1 kg, centrata nel box [0, 8)^3 (per pm)
+    s = plummer(n, seed=seed, total_mass=1.0, a=1.0)
+    s["pos"] = np.clip(s["pos"] + 4.0, 0.0, np.nextafter(8.0, 0.0))
+    return s
+
+def _make_core(backend, integrator, n, seed):
+    s = _scenario(n, seed)
+    t_dyn = np.sqrt(1.0 / G_SI)
+    dt = 1e-3 * t_dyn
+    if backend == "native":
+        from .native import NativeCore
+        with warnings.catch_warnings():     # integratore proprio ("euler" nella tabella): avviso atteso
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return NativeCore(s["pos"], s["vel"], s["mass"], s["charge"], PhysicsConfig(softening=0.01)), dt
+    cfg = PhysicsConfig(softening=0.01, integrator=integrator, block_dt=dt, box_size=8.0, **BACKENDS[backend])
+    return PhysicsCore(s["pos"], s["vel"], s["mass"], s["charge"], cfg), dt
+
+def measure(backend, integrator, n, seed=42, min_time=1.0, max_steps=50):
+    """Un caso: passo di riscaldamento escluso, poi passi fino a min_time (max max_steps)."""
+    core, dt = _make_core(backend, integrator, n, seed)
+    core.step(dt)
+    steps = 0
+    t0 = time.perf_counter()
+    while steps < max_steps:
+        core.step(dt)
+        steps += 1
+        if time.perf_counter() - t0 >= min_time:
+            break
+    elapsed = time.perf_counter() - t0
+    # picco di memoria su un passo separato (tracemalloc rallenta le allocazioni)
+    tracemalloc.start()
+    core.step(dt)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    core.close()
+    return {"backend": backend, "integrator": integrator, "N": n, "steps": steps,
+            "seconds": elapsed, "steps_per_s": steps / elapsed, "peak_bytes": int(peak)}
+
+def _native_available():
+    try:
+        from .native import load_module
+        load_module()
+        return True
+    except ImportError:
+        return False
+
+def run(sizes=SIZES, backends=None, integrators=INTEGRATORS, seed=42, min_time=1.0, budget=10.0, log=None):
+    """
+    Tutti i casi; per ogni (backend, integratore) gli N crescono finché il passo stimato
+    (N^SCALING dall'ultimo misurato) resta entro `budget` secondi, poi i casi sono saltati.
+    """
+    backends = list(BACKENDS) if backends is None else backends
+    results, skipped = [], []
+    for backend in backends:
+        if backend == "native" and not _native_available():
+            skipped.append({"backend": backend, "reason": "modulo nativo non compilato"})
+            continue
+        for integrator in (("euler",) if backend == "native" else integrators):
+            last = None
+            for n in sorted(sizes):
+                if backend == "direct" and n > DIRECT_MAX_N:
+                    skipped.append({"backend": backend, "integrator": integrator, "N": n, "reason": "memoria"})
+                    continue
+                if last is not None and (n / last["N"])**SCALING[backend] / last["steps_per_s"] > budget:
+                    skipped.append({"backend": backend, "integrator": integrator, "N": n, "reason": "budget"})
+                    continue
+                last = measure(backend, integrator, n, seed, min_time)
+                results.append(last)
+                if log:
+                    log(f"{backend:7s} {integrator:9s} N={n:<7d} {last['steps_per_s']:10.3f} passi/s "
+                        f"picco {last['peak_bytes'] / 2**20:8.1f} MiB")
+    return {"machine": machine_info(), "seed": seed, "results": results, "skipped": skipped}
+
+def machine_info():
+    return {"platform": platform.platform(), "python": platform.python_version(),
+            "numpy": np.__version__, "cpus": os.cpu_count()}
+
+def _key(r):
+    return (r["backend"], r["integrator"], r["N"])
+
+def compare(report, baseline, threshold=0.25):
+    """Regressioni: passi/s sotto baseline*(1-threshold) o picco memoria sopra baseline*(1+threshold)."""
+    base = {_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in report["results"]:
+        b = base.get(_key(r))
+        if b is None:
+            continue
+        if r["steps_per_s"] < b["steps_per_s"] * (1.0 - threshold):
+            regressions.append({**dict(zip(("backend", "integrator", "N"), _key(r))), "metric": "steps_per_s",
+                                "value": r["steps_per_s"], "baseline": b["steps_per_s"]})
+        if r["peak_bytes"] > b["peak_bytes"] * (1.0 + threshold):
+            regressions.append({**dict(zip(("backend", "integrator", "N"), _key(r))), "metric": "peak_bytes",
+                                "value": r["peak_bytes"], "baseline": b["peak_bytes"]})
+    return regressions
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark PhysicsCore: passi/s e picco memoria")
+    ap.add_argument("--n", type=int, nargs="+", default=list(SIZES))
+    ap.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    ap.add_argument("--integrators", nargs="+", default=list(INTEGRATORS), choices=list(INTEGRATORS))
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--min-time", type=float, default=1.0, help="secondi minimi misurati per caso")
+    ap.add_argument("--budget", type=float, default=10.0, help="secondi massimi stimati per passo")
+    ap.add_argument("--out", default=RESULTS_PATH)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--threshold", type=float, default=0.25, help="regressione relativa tollerata")
+    ap.add_argument("--save-baseline", action="store_true", help="scrive i risultati come nuova baseline")
+    args = ap.parse_args(argv)
+
+    report = run(args.n, args.backends, args.integrators, args.seed, args.min_time, args.budget, log=print)
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.threshold)
+    save_json(args.out, report)
+    if args.save_baseline:
+        save_json(args.baseline, report)
+    for r in report.get("regressions", []):
+        print(f"REGRESSIONE {r['backend']} {r['integrator']} N={r['N']} {r['metric']}: "
+              f"{r['value']:.4g} (baseline {r['baseline']:.4g})")
+    return 1 if report.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
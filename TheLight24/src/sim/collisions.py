@@ -0,0 +1,58 @@
+# TheLight24 v6 – Collisioni: coppie sovrapposte via griglia spaziale, fusione anelastica
+import numpy as np
+from .spatial import Grid
+
+def body_radius(mass, coeff):
+    # stesso raggio di Entity (src/simulator/entity.hpp): coeff * cbrt(m)
+    return coeff * np.cbrt(np.abs(mass))
+
+def overlapping_pairs(pos, radius):
+    """Coppie (i,j) con |x_j - x_i| < r_i + r_j: celle di lato 2*max(r), solo celle adiacenti."""
+    rmax = float(radius.max(initial=0.0))
+    if pos.shape[0] < 2 or rmax <= 0.0:
+        e = np.zeros(0, dtype=np.int64)
+        return e, e
+    ii, jj = [], []
+    for i, j in Grid(pos, 2.0*rmax).pairs():
+        dx = pos[j] - pos[i]
+        rs = radius[i] + radius[j]
+        hit = np.einsum('ij,ij->i', dx, dx) < rs*rs
+        ii.append(i[hit]); jj.append(j[hit])
+    return np.concatenate(ii), np.concatenate(jj)
+
+def components(N, i, j):
+    """Etichetta (indice minimo) della componente connessa di ogni corpo nel grafo delle coppie."""
+    lab = np.arange(N)
+    while True:
+        m = np.minimum(lab[i], lab[j])
+        new = lab.copy()
+        np.minimum.at(new, i, m)
+        np.minimum.at(new, j, m)
+        new = new[new]          # salto dei puntatori: catene lunghe in O(log) giri
+        if np.array_equal(new, lab):
+            return lab
+        lab = new
+
+def merge(pos, vel, mass, charge, radius):
+    """
+    Fonde i corpi sovrapposti (anche a catena) in un solo corpo per componente:
+    massa, quantità di moto e carica sommate, posizione nel centro di massa.
+    Ritorna (pos, vel, mass, charge, keep) compattati, keep = indici dei rappresentanti,
+    oppure None se non ci sono sovrapposizioni.
+    """
+    i, j = overlapping_pairs(pos, radius)
+    if i.size == 0:
+        return None
+    keep, g = np.unique(components(pos.shape[0], i, j), return_inverse=True)
+    n = keep.size
+    M = np.bincount(g, weights=mass, minlength=n)
+    # pesi per centro di massa e velocità; gruppi a massa nulla: media semplice
+    w = np.where(M[g] != 0.0, mass, 1.0)
+    W = np.bincount(g, weights=w, minlength=n)
+    P = np.empty((n, 3))
+    V = np.empty((n, 3))
+    for c in range(3):
+        P[:,c] = np.bincount(g, weights=w*pos[:,c], minlength=n) / W
+        V[:,c] = np.bincount(g, weights=w*vel[:,c], minlength=n) / W
+    Q = np.bincount(g, weights=charge, minlength=n)
+    return P, V, M, Q, keep
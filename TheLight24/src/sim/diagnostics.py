@@ -0,0 +1,121 @@
+# TheLight24 v6 – Diagnostiche: energia cinetica/potenziale, quantità di moto, momento angolare, centro di massa
+from collections import deque
+import numpy as np
+from .units import G_SI, K_SI
+from .barnes_hut import bh_forces
+from .pm import pm_forces
+
+def kinetic_energy(vel, mass):
+    return 0.5 * float(np.sum(mass * np.einsum('ij,ij->i', vel, vel)))
+
+def momentum(vel, mass):
+    return (mass[:,None] * vel).sum(axis=0)
+
+def angular_momentum(pos, vel, mass):
+    # rispetto all'origine
+    return np.cross(pos, mass[:,None] * vel).sum(axis=0)
+
+def center_of_mass(pos, mass):
+    M = float(np.sum(mass))
+    return (mass[:,None] * pos).sum(axis=0) / M if M else pos.mean(axis=0)
+
+def potential_energy(pos, mass, charge, cfg, G=G_SI, K=K_SI, tile=256):
+    """
+    U = -sum_{i<j} (G m_i m_j + K q_i q_j) / sqrt(r^2 + eps^2), a blocchi di righe (memoria O(N*tile)).
+    Stesso potenziale che i kernel accumulano con pot=; Yukawa escluso (nessuna forma chiusa elementare).
+    """
+    N = pos.shape[0]
+    eps2 = cfg.softening**2
+    U = 0.0
+    if not (cfg.grav or cfg.coulomb):
+        return U
+    for i0 in range(0, N, tile):
+        i1 = min(N, i0 + tile)
+        dx = pos[np.newaxis,i0:,:] - pos[i0:i1,np.newaxis,:]
+        with np.errstate(divide="ignore"):
+            inv_r = (np.einsum('ijc,ijc->ij', dx, dx) + eps2)**(-0.5)
+        # solo j>i nel blocco diagonale (assegnazione: niente inf*0 con softening nullo)
+        inv_r[:, :i1 - i0][np.tril_indices(i1 - i0)] = 0.0
+        c = 0.0
+        if cfg.grav:
+            c = (G * mass[i0:i1])[:,None] * mass[None,i0:]
+        if cfg.coulomb:
+            c = c + (K * charge[i0:i1])[:,None] * charge[None,i0:]
+        U -= float(np.sum(c * inv_r))
+    return U
+
+class Diagnostics:
+    """
+    Quantità conservate campionate ogni `every` passi (0 = spente), in SI.
+    Il potenziale viene dal calcolo delle forze del passo stesso (core.want_potential), per
+    ogni solver e integratore: a fine passo (leapfrog, yoshida4, block) oppure da k1 con rk4,
+    nel qual caso il campione è lo stato di inizio passo. Fuori dal passo lo si ricalcola
+    con il solver: albero (bh), mesh periodica (pm) o potential_energy a blocchi.
+    """
+    def __init__(self, every=0, history=256):
+        self.every = int(every)
+        self.steps = 0
+        self.samples = deque(maxlen=history)
+        self.E0 = None
+        self._t0 = None
+
+    def due(self):
+        # il prossimo passo chiude un intervallo di campionamento
+        return self.every > 0 and (self.steps + 1) % self.every == 0
+
+    def before_step(self, core, t=None):
+        core.want_potential = self.due()
+        self._t0 = t    # clock di inizio passo (campione dallo stato di k1)
+
+    def after_step(self, core, t, units=None):
+        sample = self.due()
+        self.steps += 1
+        core.want_potential = False
+        if sample:
+            self.samples.append(self.measure(core, t, units, t_start=self._t0))
+
+    def measure(self, core, t, units=None, t_start=None):
+        pos, vel, mass, charge = core.pos, core.vel, core.mass, core.charge
+        cfg = core.cfg
+        G, K = getattr(core, "G", G_SI), getattr(core, "K", K_SI)
+        step = self.steps
+        if getattr(core, "_pot_pos", None) is pos:
+            U, source = core._pot, "force-pass"
+        elif getattr(core, "_pot_vel", None) is not None:
+            # rk4: potenziale di k1 -> campione dello stato di inizio passo, senza ricalcolo
+            pos, vel = core._pot_pos, core._pot_vel
+            U, source = core._pot, "force-pass"
+            t, step = (t if t_start is None else t_start), step - 1
+        elif cfg.solver == "pm":
+            pot = np.zeros(1)
+            pm_forces(pos, mass, charge, cfg, G=G, K=K, pot=pot)
+            U, source = float(pot[0]), "mesh"
+        elif cfg.solver == "bh":
+            pot = np.zeros(1)
+            bh_forces(pos, mass, charge, cfg, G=G, K=K, pot=pot)
+            U, source = float(pot[0]), "tree"
+        else:
+            U = potential_energy(pos, mass, charge, cfg, G, K)
+            source = "direct"
+        if units is not None:
+            pos, vel, mass = units.pos_si(pos), units.vel_si(vel), units.mass_si(mass)
+            U = units.energy_si(U)
+        T = kinetic_energy(vel, mass)
+        E = T + U
+        if self.E0 is None:
+            self.E0 = E
+        return {
+            "t": t,
+            "step": step,
+            "kinetic": T,
+            "potential": U,
+            "energy": E,
+            "dE_rel": (E - self.E0) / abs(self.E0) if self.E0 else 0.0,
+            "momentum": momentum(vel, mass).tolist(),
+            "angular_momentum": angular_momentum(pos, vel, mass).tolist(),
+            "center_of_mass": center_of_mass(pos, mass).tolist(),
+            "potential_source": source,
+        }
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
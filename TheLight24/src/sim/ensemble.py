@@ -0,0 +1,186 @@
+# TheLight24 v6 – Ensemble: M universi indipendenti in array (M,N,3), kernel NumPy batch
+import copy, json
+import numpy as np
+from .physics_core import PhysicsConfig
+from .units import G_SI, K_SI
+
+PAIR_BUDGET = 1 << 22       # elementi (membro,i,j) per blocco di membri nel kernel denso
+
+# parametri che possono variare da membro a membro (array (M,))
+SWEEP_PARAMS = ("softening", "yukawa_lambda", "yukawa_alpha", "drag_gamma")
+
+class Ensemble:
+    """
+    M copie dello stesso scenario integrate insieme: pos/vel (M,N,3), mass/charge (M,N).
+    Leggi attive (grav/coulomb/yukawa/drag) comuni, parametri SWEEP_PARAMS per membro.
+    Forze dense a blocchi di membri (memoria O(PAIR_BUDGET)), leapfrog KDK con dt per membro
+    e maschera dei membri attivi: pensato per N piccoli e M grandi (sweep di parametri).
+    """
+    def __init__(self, pos, vel, mass, charge=None, cfg: PhysicsConfig = None, members=None, **sweep):
+        self.cfg = cfg or PhysicsConfig()
+        pos = np.asarray(pos, dtype=np.float64)
+        vel = np.asarray(vel, dtype=np.float64)
+        if members is None:
+            # M dagli array per membro: stato (M,N,3) oppure parametri (M,)
+            sizes = [a.shape[0] for a in (pos, vel) if a.ndim == 3]
+            sizes += [np.size(v) for v in sweep.values() if np.ndim(v) > 0]
+            members = max(sizes, default=1)
+        self.M = int(members)
+        self.N = pos.shape[-2]
+        self.pos = np.broadcast_to(pos, (self.M, self.N, 3)).copy()
+        self.vel = np.broadcast_to(vel, (self.M, self.N, 3)).copy()
+        # masse/cariche in sola lettura: broadcast senza copia se comuni a tutti i membri
+        self.mass = np.broadcast_to(np.asarray(mass, dtype=np.float64), (self.M, self.N))
+        charge = np.zeros(self.N) if charge is None else np.asarray(charge, dtype=np.float64)
+        self.charge = np.broadcast_to(charge, (self.M, self.N))
+        for k in sweep:
+            if k not in SWEEP_PARAMS:
+                raise ValueError(f"parametro non variabile per membro: {k}")
+        self.params = {k: np.broadcast_to(np.asarray(sweep.get(k, getattr(self.cfg, k)), dtype=np.float64),
+                                          (self.M,)).copy()
+                       for k in SWEEP_PARAMS}
+        self.G, self.K = G_SI, K_SI
+        self.t = np.zeros(self.M)
+        # accelerazioni e distanza minima alla posizione corrente, valide dove _ok
+        self._acc = np.zeros((self.M, self.N, 3))
+        self._rmin = np.full(self.M, np.inf)
+        self._ok = np.zeros(self.M, dtype=bool)
+
+    @classmethod
+    def from_json(cls, path, members=None, **sweep):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        mass = np.array(data["mass"], dtype=np.float64)
+        return cls(data["pos"], data["vel"], mass, data.get("charge", [0.0]*len(mass)),
+                   PhysicsConfig.from_dict(data.get("physics", {})), members=members, **sweep)
+
+    def member_config(self, k):
+        """PhysicsConfig equivalente del membro k (per confronti con PhysicsCore)."""
+        c = copy.copy(self.cfg)
+        for p in SWEEP_PARAMS:
+            setattr(c, p, float(self.params[p][k]))
+        return c
+
+    def _forces(self, pos, idx):
+        # forze conservative (m,N,3) e distanza minima (m,) dei membri idx alle posizioni pos
+        m, N = pos.shape[0], self.N
+        F = np.zeros_like(pos)
+        rmin = np.full(m, np.inf)
+        cfg = self.cfg
+        d = np.arange(N)
+        chunk = max(1, PAIR_BUDGET // (N*N))
+        for a in range(0, m, chunk):
+            b = min(m, a + chunk)
+            k = idx[a:b]
+            dx = pos[a:b, np.newaxis, :, :] - pos[a:b, :, np.newaxis, :]   # (c,N,N,3): x_j - x_i
+            d2 = np.einsum('mijc,mijc->mij', dx, dx)
+            r2 = d2 + (self.params["softening"][k]**2)[:, None, None]
+            inv_r3 = r2**(-1.5)
+            inv_r3[:, d, d] = 0.0
+            coef = 0.0
+            if cfg.grav:
+                mk = self.mass[k]
+                coef = self.G * mk[:, :, None] * mk[:, None, :]
+            if cfg.coulomb:
+                qk = self.charge[k]
+                coef = coef + self.K * qk[:, :, None] * qk[:, None, :]
+            if cfg.yukawa:
+                lam = self.params["yukawa_lambda"][k][:, None, None]
+                coef = coef + self.params["yukawa_alpha"][k][:, None, None] * np.exp(-np.sqrt(r2) / lam)
+            if cfg.grav or cfg.coulomb or cfg.yukawa:
+                F[a:b] = np.einsum('mij,mijc->mic', coef * inv_r3, dx)
+            # coppie coincidenti ignorate, come min_separation
+            d2[d2 == 0.0] = np.inf
+            rmin[a:b] = np.sqrt(d2.reshape(b - a, -1).min(axis=1))
+        return F, rmin
+
+    def _accel(self, pos, idx):
+        F, rmin = self._forces(pos, idx)
+        acc = F / self.mass[idx][:, :, None]
+        self._acc[idx], self._rmin[idx], self._ok[idx] = acc, rmin, True
+        return acc
+
+    def _current_accel(self, idx):
+        stale = idx[~self._ok[idx]]
+        if stale.size:
+            self._accel(self.pos[stale], stale)
+        return self._acc[idx]
+
+    def invalidate(self):
+        """Da chiamare dopo modifiche esterne a pos/mass/charge/params."""
+        self._ok[:] = False
+
+    def _kick(self, vel, acc, h, idx):
+        # h (m,1,1); drag esatto per membro come PhysicsCore._kick
+        if not self.cfg.drag:
+            return vel + h*acc
+        c = (self.params["drag_gamma"][idx][:, None] / self.mass[idx])[:, :, None]
+        decay = np.exp(-c*h)
+        gain = np.where(c > 0, -np.expm1(-c*h) / np.where(c > 0, c, 1.0), h)
+        return vel*decay + acc*gain
+
+    def suggest_dt(self, idx=None, dt_max=10.0, safety=0.4):
+        """dt per membro con la stessa euristica di PhysicsCore.suggest_dt."""
+        idx = np.arange(self.M) if idx is None else np.asarray(idx)
+        self._current_accel(idx)
+        vmax = np.maximum(1e-6, np.linalg.norm(self.vel[idx], axis=2).max(axis=1))
+        return np.clip(safety * self._rmin[idx] / vmax, 1e-4, dt_max)
+
+    def step(self, dt=None, active=None):
+        """
+        Un passo KDK dei membri attivi (maschera bool (M,) o indici; tutti se None).
+        dt: None (adattivo per membro), scalare o array (M,). Ritorna i dt usati (M,), 0 per gli inattivi.
+        """
+        if active is None:
+            idx = np.arange(self.M)
+        else:
+            active = np.asarray(active)
+            idx = np.flatnonzero(active) if active.dtype == bool else active
+        used = np.zeros(self.M)
+        if idx.size == 0:
+            return used
+        if dt is None:
+            h = self.suggest_dt(idx)
+        else:
+            h = np.broadcast_to(np.asarray(dt, dtype=np.float64), (self.M,))[idx]
+        h3 = h[:, None, None]
+        vel = self._kick(self.vel[idx], self._current_accel(idx), 0.5*h3, idx)
+        pos = self.pos[idx] + h3*vel
+        self.vel[idx] = self._kick(vel, self._accel(pos, idx), 0.5*h3, idx)
+        self.pos[idx] = pos
+        self.t[idx] += h
+        used[idx] = h
+        return used
+
+    def advance(self, t_end, dt=None, max_steps=100000):
+        """
+        Porta ogni membro a t_end con il proprio dt: ad ogni giro avanzano solo i membri
+        ancora indietro (maschera), l'ultimo passo è accorciato per arrivare esattamente.
+        Ritorna il numero di passi fatti da ciascun membro.
+        """
+        steps = np.zeros(self.M, dtype=np.int64)
+        for _ in range(max_steps):
+            idx = np.flatnonzero(self.t < t_end)
+            if idx.size == 0:
+                break
+            if dt is None:
+                h = self.suggest_dt(idx)
+            else:
+                h = np.broadcast_to(np.asarray(dt, dtype=np.float64), (self.M,))[idx]
+            rem = t_end - self.t[idx]
+            h = np.minimum(h, rem)
+            full = np.zeros(self.M)
+            full[idx] = h
+            self.step(full, active=idx)
+            self.t[idx[h >= rem]] = t_end     # niente residui di arrotondamento
+            steps[idx] += 1
+        return steps
+
+    def snapshot(self, k):
+        return {
+            "t": float(self.t[k]),
+            "N": self.N,
+            "pos": self.pos[k].tolist(),
+            "vel": self.vel[k].tolist(),
+            "mass": self.mass[k].tolist(),
+        }
@@ -0,0 +1,107 @@
+# TheLight24 v6 – Generatori procedurali di scenari (riproducibili dato il seed), unità SI
+import inspect
+import numpy as np
+from .units import G_SI
+
+K_BOLTZMANN = 1.380649e-23   # J/K
+
+def _directions(rng, n):
+    # versori isotropi
+    u = rng.normal(size=(n,3))
+    return u / np.linalg.norm(u, axis=1)[:,None]
+
+def _state(pos, vel, mass, charge=None):
+    n = pos.shape[0]
+    return {
+        "pos": pos,
+        "vel": vel,
+        "mass": np.broadcast_to(np.asarray(mass, dtype=np.float64), (n,)).copy(),
+        "charge": np.zeros(n) if charge is None else np.broadcast_to(np.asarray(charge, dtype=np.float64), (n,)).copy(),
+    }
+
+def plummer(n, seed=0, total_mass=1.0, a=1.0, G=G_SI):
+    """Sfera di Plummer in equilibrio (Aarseth, Hénon & Wielen 1974): raggio di scala a."""
+    rng = np.random.default_rng(seed)
+    # M(<r)/M = X  ->  r = a / sqrt(X^(-2/3) - 1), code estreme escluse
+    X = rng.uniform(1e-10, 0.999, n)
+    r = a / np.sqrt(X**(-2.0/3.0) - 1.0)
+    pos = r[:,None] * _directions(rng, n)
+    # |v| = q * v_fuga con g(q) = q^2 (1-q^2)^3.5, campionata per rigetto (max g < 0.1)
+    q = np.empty(n)
+    todo = np.arange(n)
+    while todo.size:
+        x = rng.uniform(0.0, 1.0, todo.size)
+        y = rng.uniform(0.0, 0.1, todo.size)
+        ok = y < x*x * (1.0 - x*x)**3.5
+        q[todo[ok]] = x[ok]
+        todo = todo[~ok]
+    v_esc = np.sqrt(2.0 * G * total_mass / np.sqrt(r*r + a*a))
+    vel = (q * v_esc)[:,None] * _directions(rng, n)
+    return _state(pos, vel, total_mass / n)
+
+def exponential_disk(n, seed=0, total_mass=1.0, scale_length=1.0, scale_height=0.1,
+                     central_mass=0.0, dispersion=0.05, G=G_SI):
+    """
+    Disco sottile Sigma(R) ~ exp(-R/Rd) nel piano xy, rotazione circolare con
+    M(<R) sferica approssimata (+ massa centrale opzionale) e dispersione relativa `dispersion`.
+    """
+    rng = np.random.default_rng(seed)
+    R = rng.gamma(2.0, scale_length, n)           # p(R) ~ R exp(-R/Rd)
+    phi = rng.uniform(0.0, 2*np.pi, n)
+    z = rng.laplace(0.0, scale_height, n)
+    pos = np.stack([R*np.cos(phi), R*np.sin(phi), z], axis=1)
+    x = R / scale_length
+    M_in = total_mass * (1.0 - (1.0 + x)*np.exp(-x)) + central_mass
+    vc = np.sqrt(G * M_in / np.maximum(R, 1e-12*scale_length))
+    vel = np.stack([-vc*np.sin(phi), vc*np.cos(phi), np.zeros(n)], axis=1)
+    vel += dispersion * vc[:,None] * rng.normal(size=(n,3))
+    state = _state(pos, vel, total_mass / n)
+    if central_mass > 0:
+        # corpo centrale fermo in testa agli array
+        for k, v in (("pos", np.zeros((1,3))), ("vel", np.zeros((1,3))),
+                     ("mass", [central_mass]), ("charge", [0.0])):
+            state[k] = np.concatenate([np.asarray(v, dtype=np.float64), state[k]])
+    return state
+
+def plasma_box(n, seed=0, box_size=1.0, temperature=300.0, mass=1.67e-27, charge=1.602e-19):
+    """Box uniforme [0, L)^3, cariche alternate +q/-q (neutro), velocità maxwelliane a temperatura T."""
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0.0, box_size, size=(n,3))
+    sigma = np.sqrt(K_BOLTZMANN * temperature / mass)
+    vel = rng.normal(0.0, sigma, size=(n,3))
+    vel -= vel.mean(axis=0)     # quantità di moto totale nulla
+    q = np.where(np.arange(n) % 2 == 0, charge, -charge)
+    return _state(pos, vel, mass, q)
+
+def lattice(n, seed=0, spacing=1.0, mass=1.0, jitter=0.0):
+    """Reticolo cubico (prime n posizioni di un cubo ceil(cbrt(n))^3), con jitter relativo opzionale."""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(round(n**(1.0/3.0), 9)))
+    g = np.arange(side) * spacing
+    pos = np.stack(np.meshgrid(g, g, g, indexing="ij"), axis=-1).reshape(-1, 3)[:n].copy()
+    if jitter:
+        pos += jitter * spacing * rng.uniform(-0.5, 0.5, size=pos.shape)
+    return _state(pos, np.zeros((n,3)), mass)
+
+GENERATORS = {
+    "plummer": plummer,
+    "exponential_disk": exponential_disk,
+    "plasma_box": plasma_box,
+    "lattice": lattice,
+}
+
+def generate(spec):
+    """spec = {"type": <nome in GENERATORS>, "n": ..., altri parametri del generatore}."""
+    spec = dict(spec)
+    kind = spec.pop("type", None)
+    if kind not in GENERATORS:
+        raise ValueError(f"Generatore sconosciuto: {kind} (disponibili: {', '.join(GENERATORS)})")
+    params = inspect.signature(GENERATORS[kind]).parameters
+    unknown = set(spec) - set(params)
+    if unknown:
+        raise ValueError(f"{kind}: parametri sconosciuti {', '.join(sorted(unknown))} "
+                         f"(ammessi: {', '.join(params)})")
+    missing = [k for k, p in params.items() if p.default is p.empty and k not in spec]
+    if missing:
+        raise ValueError(f"{kind}: parametri mancanti {', '.join(missing)}")
+    return GENERATORS[kind](**spec)
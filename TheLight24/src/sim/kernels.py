@@ -0,0 +1,93 @@
+# TheLight24 v6 – Kernel a coppie per somma diretta, a blocchi di righe (memoria O(N*tile))
+# Tutte le leggi attive (gravità, Coulomb, Yukawa) condividono r2/inv_r3 e un solo coefficiente.
+# dtype=float32: aritmetica dei blocchi in singola precisione, somma tra blocchi in float64.
+# pot (array (1,) opzionale): accumula l'energia potenziale gravità+Coulomb dagli stessi r2/inv_r3
+# (con rows: la parte di quelle righe, metà per coppia; su righe che coprono tutte le particelle è U).
+import numpy as np
+from .units import G_SI, K_SI
+
+def _row_tiles(N, rows, tile):
+    rows = np.arange(N) if rows is None else np.asarray(rows)
+    for i0 in range(0, rows.size, tile):
+        yield rows[i0:i0 + tile]
+
+def _pair_coef(r2, inv_r3, i, j, mass, charge, cfg, grav, coulomb, yukawa, G, K, pot=None, w=1.0):
+    # coefficiente unico (t,n) di tutte le leggi attive: F_ij = coef_ij * (x_j - x_i)
+    c = 0.0
+    if grav:
+        c = (G * mass[i])[:,None] * mass[j][None,:]
+    if coulomb:
+        c = c + (K * charge[i])[:,None] * charge[j][None,:]
+    if pot is not None and (grav or coulomb):
+        # U_ij = -c_ij / r_ij = -c_ij * inv_r3 * r2 (w = 1/2 se ogni coppia compare due volte)
+        pot[0] -= w * np.sum(c * inv_r3 * r2, dtype=np.float64)
+    if yukawa:
+        c = c + cfg.yukawa_alpha * np.exp(-np.sqrt(r2) / cfg.yukawa_lambda)
+    return c * inv_r3
+
+def _cast(dtype, *arrays):
+    return [np.asarray(a).astype(dtype, copy=False) for a in arrays]
+
+def tiled_forces(pos, mass, charge, cfg, grav=True, coulomb=False, yukawa=False,
+                 rows=None, G=G_SI, K=K_SI, dtype=np.float64, pot=None):
+    """
+    Forze sulle particelle `rows` (tutte se None) da tutte le sorgenti.
+    Stessa fisica di PhysicsCore._direct_forces, ma blocchi (tile,N) invece di (N,N).
+    """
+    N = pos.shape[0]
+    out = np.zeros((N if rows is None else len(rows), 3))
+    pos, mass, charge = _cast(dtype, pos, mass, charge)
+    eps2 = cfg.softening**2
+    cols = slice(None)
+    k = 0
+    for r in _row_tiles(N, rows, cfg.tile_size):
+        dx = pos[np.newaxis,:,:] - pos[r][:,np.newaxis,:]     # (t,N,3)
+        r2 = np.einsum('ijc,ijc->ij', dx, dx) + eps2           # (t,N)
+        inv_r3 = r2**(-1.5)
+        inv_r3[np.arange(r.size), r] = 0.0
+        coef = _pair_coef(r2, inv_r3, r, cols, mass, charge, cfg, grav, coulomb, yukawa, G, K,
+                          pot=pot, w=0.5)
+        out[k:k + r.size] += np.einsum('ij,ijc->ic', coef, dx)
+        k += r.size
+    return out
+
+def yukawa_pair_forces(pos, i, j, cfg, rc):
+    """Yukawa solo sulle coppie (i,j) della lista con |x_j - x_i| <= rc, +F su i e -F su j."""
+    dx = pos[j] - pos[i]
+    d2 = np.einsum('ij,ij->i', dx, dx)
+    inside = d2 <= rc*rc
+    i, j, dx, d2 = i[inside], j[inside], dx[inside], d2[inside]
+    r2 = d2 + cfg.softening**2
+    coef = cfg.yukawa_alpha * np.exp(-np.sqrt(r2) / cfg.yukawa_lambda) * r2**(-1.5)
+    f = coef[:,None] * dx
+    N = pos.shape[0]
+    F = np.empty((N, 3))
+    for c in range(3):
+        F[:,c] = np.bincount(i, weights=f[:,c], minlength=N) - np.bincount(j, weights=f[:,c], minlength=N)
+    return F
+
+def symmetric_forces(pos, mass, charge, cfg, grav=True, coulomb=False, yukawa=False,
+                     G=G_SI, K=K_SI, dtype=np.float64, pot=None):
+    """
+    Come tiled_forces su tutte le particelle, ma ogni coppia non ordinata (i<j)
+    è valutata una sola volta: blocco righe [i0,i1) contro colonne [i0,N),
+    poi +F sulle righe e -F sulle colonne (terza legge di Newton).
+    """
+    N = pos.shape[0]
+    F = np.zeros((N, 3))
+    pos, mass, charge = _cast(dtype, pos, mass, charge)
+    eps2 = cfg.softening**2
+    t = cfg.tile_size
+    for i0 in range(0, N, t):
+        i1 = min(N, i0 + t)
+        r = np.arange(i0, i1)
+        c = slice(i0, N)
+        dx = pos[np.newaxis,i0:,:] - pos[i0:i1,np.newaxis,:]  # (t,N-i0,3)
+        r2 = np.einsum('ijc,ijc->ij', dx, dx) + eps2
+        inv_r3 = r2**(-1.5)
+        # nel blocco diagonale solo j>i
+        inv_r3[:, :i1 - i0] *= np.triu(np.ones((i1 - i0, i1 - i0), dtype=dtype), 1)
+        coef = _pair_coef(r2, inv_r3, r, c, mass, charge, cfg, grav, coulomb, yukawa, G, K, pot=pot)
+        F[i0:i1] += np.einsum('ij,ijc->ic', coef, dx)
+        F[i0:] -= np.einsum('ij,ijc->jc', coef, dx)
+    return F
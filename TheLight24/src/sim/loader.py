@@ -0,0 +1,97 @@
+# TheLight24 v6 – Lettura scenari (.json, .npy, .npz) con cache per hash del file
+import hashlib, json, os
+from collections import OrderedDict
+import numpy as np
+from .generators import generate
+
+CACHE_SIZE = 4
+_cache = OrderedDict()      # sha1 del file -> scenario letto (array in sola lettura)
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _check_shapes(path, state):
+    mass = state["mass"]
+    N = mass.shape[0] if mass.ndim == 1 else -1
+    if N < 0 or any(state[k].shape != (N, 3) for k in ("pos", "vel")) or state["charge"].shape != (N,):
+        raise ValueError(f"{path}: attesi pos/vel (N,3) e mass/charge (N,)")
+    return state
+
+def _parse_json(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    physics = data.get("physics", {})
+    if "generator" in data:
+        if not isinstance(data["generator"], dict):
+            raise ValueError(f"{path}: \"generator\" deve essere un oggetto {{\"type\": ..., ...}}")
+        return generate(data["generator"]), physics
+    missing = [k for k in ("pos", "vel", "mass") if k not in data]
+    if missing:
+        raise ValueError(f"{path}: campi mancanti {', '.join(missing)} (o \"generator\")")
+    try:
+        mass = np.array(data["mass"], dtype=np.float64)
+        state = {
+            "pos": np.array(data["pos"], dtype=np.float64),     # [[x,y,z],...]
+            "vel": np.array(data["vel"], dtype=np.float64),
+            "mass": mass,
+            "charge": np.array(data.get("charge", [0.0]*len(mass)), dtype=np.float64),
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{path}: valori non numerici o liste irregolari ({e})")
+    return _check_shapes(path, state), physics
+
+def _parse_npy(path):
+    # colonne x y z vx vy vz m [q]
+    a = np.load(path)
+    if a.ndim != 2 or a.shape[1] not in (7, 8):
+        raise ValueError(f"{path}: atteso array (N,7) o (N,8) [x y z vx vy vz m (q)]")
+    a = a.astype(np.float64, copy=False)
+    charge = a[:,7].copy() if a.shape[1] == 8 else np.zeros(a.shape[0])
+    return {"pos": a[:,0:3].copy(), "vel": a[:,3:6].copy(), "mass": a[:,6].copy(), "charge": charge}, {}
+
+def _parse_npz(path):
+    # array pos, vel, mass, charge (opzionale) + "physics" come stringa JSON (opzionale)
+    with np.load(path) as z:
+        missing = [k for k in ("pos", "vel", "mass") if k not in z.files]
+        if missing:
+            raise ValueError(f"{path}: array mancanti {', '.join(missing)}")
+        try:
+            mass = z["mass"].astype(np.float64)
+            state = {
+                "pos": z["pos"].astype(np.float64),
+                "vel": z["vel"].astype(np.float64),
+                "mass": mass,
+                "charge": z["charge"].astype(np.float64) if "charge" in z.files else np.zeros_like(mass),
+            }
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{path}: array non numerici ({e})")
+        physics = json.loads(str(z["physics"])) if "physics" in z.files else {}
+    return _check_shapes(path, state), physics
+
+_PARSERS = {".json": _parse_json, ".npy": _parse_npy, ".npz": _parse_npz}
+
+def read_scenario(path):
+    """
+    Ritorna (stato, physics): stato = copie fresche di pos/vel/mass/charge, physics = dict.
+    Il parsing (o la generazione) è in cache LRU, chiave = hash del contenuto del file.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _PARSERS:
+        raise ValueError(f"Formato scenario non supportato: {ext}")
+    key = file_hash(path)
+    if key in _cache:
+        _cache.move_to_end(key)
+    else:
+        state, physics = _PARSERS[ext](path)
+        for a in state.values():
+            a.flags.writeable = False
+        _cache[key] = (state, physics)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    state, physics = _cache[key]
+    # il core può modificare gli array in place (es. wrap periodico): copie
+    return {k: a.copy() for k, a in state.items()}, dict(physics)
@@ -0,0 +1,112 @@
+# TheLight24 v6 – Backend nativo: Simulator C++ (src/simulator) dietro l'interfaccia di PhysicsCore
+import os, sys, warnings
+import numpy as np
+from .units import clamp
+from .spatial import min_separation
+from .collisions import body_radius, merge
+from .profiling import Profiler, profiled
+
+BUILD_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "build")
+
+def load_module():
+    """Modulo pybind `physics_core` compilato in build/ (cmake -S . -B build && cmake --build build)."""
+    if BUILD_DIR not in sys.path:
+        sys.path.append(BUILD_DIR)
+    try:
+        import physics_core
+    except ImportError as e:
+        raise ImportError("Modulo nativo physics_core non trovato: esegui la build in /build") from e
+    return physics_core
+
+class NativeCore:
+    """
+    Stato nel Simulator C++ (structure-of-arrays); pos/vel/mass sono viste NumPy sui suoi
+    vettori, quindi step() non copia né converte nulla tra Python e C++.
+    Leggi da PhysicsConfig: grav, coulomb, yukawa (alpha, mu = 1/lambda), drag lineare gamma,
+    softening. Integrazione Eulero semi-implicito del kernel nativo, senza pareti né Casimir;
+    collisioni (cfg.collisions) fuse lato Python sulle viste, poi il Simulator viene accorciato.
+    Solo somma diretta in float64: solver, precisione e integratori espliciti diversi sono
+    rifiutati (ValueError); l'integratore di default (rk4) viene sostituito con un avviso.
+    """
+    def __init__(self, pos, vel, mass, charge=None, cfg=None):
+        from .physics_core import PhysicsConfig
+        self.cfg = cfg or PhysicsConfig()
+        pc = load_module()
+        pos = np.asarray(pos, dtype=np.float64)
+        self.N = pos.shape[0]
+        self.sim = pc.Simulator()
+        self.sim.resize(self.N)
+        self._views()
+        self.merged = 0
+        self.prof = Profiler()
+        self.pos[:] = pos
+        self.vel[:] = vel
+        self.mass[:] = mass
+        self.charge[:] = 0.0 if charge is None else charge
+        self.configure(self.cfg)
+
+    def _views(self):
+        # viste prese dopo resize (add/resize riallocano)
+        self.pos, self.vel = self.sim.pos, self.sim.vel
+        self.mass, self.charge = self.sim.mass, self.sim.charge
+
+    def configure(self, cfg):
+        if cfg.solver not in ("tiled", "direct"):
+            raise ValueError(f"backend nativo: solo somma diretta, solver={cfg.solver!r} non supportato")
+        if cfg.precision != "float64":
+            raise ValueError(f"backend nativo: solo float64, precision={cfg.precision!r} non supportata")
+        if cfg.integrator != "rk4":
+            raise ValueError(f"backend nativo: Eulero semi-implicito, integrator={cfg.integrator!r} non supportato")
+        warnings.warn("backend nativo: integrazione con Eulero semi-implicito al posto di rk4", RuntimeWarning)
+        s = self.sim
+        s.grav, s.coulomb, s.yukawa = bool(cfg.grav), bool(cfg.coulomb), bool(cfg.yukawa)
+        s.casimir = s.walls = False
+        s.yukawa_alpha = cfg.yukawa_alpha
+        s.yukawa_mu = 1.0 / cfg.yukawa_lambda
+        s.drag = 0.0
+        s.drag_gamma = cfg.drag_gamma if cfg.drag else 0.0
+        s.softening2 = max(cfg.softening**2, 1e-300)
+        self.cfg = cfg
+
+    @profiled("suggest_dt")
+    def suggest_dt(self, dt_max=10.0, safety=0.4):
+        # stessa euristica di PhysicsCore.suggest_dt, sulle viste (nessuna copia)
+        vmax = max(1e-6, float(np.max(np.linalg.norm(self.vel, axis=1), initial=0.0)))
+        return clamp(safety * min_separation(self.pos) / vmax, 1e-4, dt_max)
+
+    @profiled("step")
+    def step(self, dt=None):
+        if dt is None:
+            dt = self.suggest_dt()
+        self.sim.dt = dt
+        with self.prof.phase("native.step"):
+            self.sim.step(1)
+        if self.prof.enabled:
+            self.prof.count("force_evals")
+            self.prof.count("force_rows", self.N)
+        if self.cfg.collisions:
+            self._collide()
+        return dt
+
+    def _collide(self):
+        out = merge(self.pos, self.vel, self.mass, self.charge,
+                    body_radius(self.mass, self.cfg.collision_radius))
+        if out is None:
+            return 0
+        pos, vel, mass, charge, keep = out
+        n = keep.size
+        self.pos[:n], self.vel[:n], self.mass[:n], self.charge[:n] = pos, vel, mass, charge
+        # resize rifiuta finché esistono viste: si rilasciano e si riprendono dopo
+        self.pos = self.vel = self.mass = self.charge = None
+        self.sim.resize(n)
+        self._views()
+        lost = self.N - n
+        self.N = n
+        self.merged += lost
+        return lost
+
+    def invalidate(self):
+        pass
+
+    def close(self):
+        pass
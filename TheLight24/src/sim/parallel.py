@@ -0,0 +1,125 @@
+# TheLight24 v6 – Forze multi-core: pool persistente di processi su multiprocessing.shared_memory
+import copy
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+def _attach(name, shape, dtype):
+    # i worker "spawn" condividono il resource tracker del padre, che resta il solo a fare unlink
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _worker(k, W, N, names, cfg, units, conn):
+    from .physics_core import PhysicsCore
+    segs = {}
+    arr = {}
+    for key, shape, dtype in _layout(N):
+        segs[key], arr[key] = _attach(names[key], shape, dtype)
+    core = PhysicsCore(arr["pos"], np.zeros((N,3)), arr["mass"], arr["charge"], cfg, units=units)
+    try:
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            if msg[0] == "cfg":
+                core.cfg = msg[1]
+                conn.send(True)
+                continue
+            # ("go", n, pot): n<0 tutte le particelle, altrimenti le prime n di arr["rows"];
+            # con pot si risponde con il potenziale della propria fetta di righe
+            _, n, want = msg
+            total = N if n < 0 else n
+            a, b = k*total // W, (k + 1)*total // W
+            pot = np.zeros(1) if want else None
+            if b > a:
+                rows = np.arange(a, b) if n < 0 else arr["rows"][a:b]
+                arr["out"][a:b] = core._kernel_forces(arr["pos"], rows=rows, pot=pot)
+            conn.send(float(pot[0]) if want else True)
+    finally:
+        del core, arr
+        for s in segs.values():
+            s.close()
+
+def _layout(N):
+    return [("pos", (N,3), np.float64), ("mass", (N,), np.float64), ("charge", (N,), np.float64),
+            ("rows", (N,), np.int64), ("out", (N,3), np.float64)]
+
+class ForcePool:
+    """
+    W processi persistenti che condividono pos/mass/charge/out in memoria condivisa.
+    Ogni valutazione copia solo le posizioni nel segmento e invia un messaggio minimo;
+    il worker k calcola la sua fetta di righe e la scrive in place in `out`.
+    """
+    def __init__(self, pos, mass, charge, cfg, workers, units=None):
+        self.N = pos.shape[0]
+        self.W = workers
+        self._segs = {}
+        self.arr = {}
+        for key, shape, dtype in _layout(self.N):
+            nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            self._segs[key] = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.arr[key] = np.ndarray(shape, dtype=dtype, buffer=self._segs[key].buf)
+        self.arr["pos"][:] = pos
+        self.set_sources(mass, charge)
+        self.cfg = dict(vars(cfg))      # configurazione dei worker (per rilevare modifiche)
+
+        ctx = mp.get_context("spawn")   # niente fork di un processo con thread (FastAPI)
+        names = {k: s.name for k, s in self._segs.items()}
+        wcfg = _serial_copy(cfg)
+        self._conns, self._procs = [], []
+        for k in range(workers):
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_worker, args=(k, workers, self.N, names, wcfg, units, child), daemon=True)
+            p.start()
+            self._conns.append(parent)
+            self._procs.append(p)
+
+    def set_sources(self, mass, charge):
+        self.arr["mass"][:] = mass
+        self.arr["charge"][:] = charge
+
+    def set_config(self, cfg):
+        self.cfg = dict(vars(cfg))
+        wcfg = _serial_copy(cfg)
+        for c in self._conns:
+            c.send(("cfg", wcfg))
+        for c in self._conns:
+            c.recv()
+
+    def forces(self, pos, rows=None, pot=None):
+        # pot (array (1,)): somma dei potenziali delle fette (solo con rows=None è U)
+        np.copyto(self.arr["pos"], pos)
+        if rows is None:
+            n = -1
+        else:
+            n = len(rows)
+            self.arr["rows"][:n] = rows
+        for c in self._conns:
+            c.send(("go", n, pot is not None))
+        for c in self._conns:
+            part = c.recv()
+            if pot is not None:
+                pot[0] += part
+        return self.arr["out"][:self.N if n < 0 else n].copy()
+
+    def close(self):
+        for c in self._conns:
+            try:
+                c.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for p in self._procs:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+        self._conns, self._procs = [], []
+        self.arr = {}
+        for s in self._segs.values():
+            s.close()
+            s.unlink()
+        self._segs = {}
+
+def _serial_copy(cfg):
+    c = copy.copy(cfg)
+    c.workers = 0
+    return c
@@ -1,6 +1,17 @@
 # TheLight24 v6 – Physics core (3D N-body, Coulomb, optional Yukawa/drag), NumPy vectorized
 import numpy as np
-from .units import G_SI, EPS0_SI, clamp
+from .units import G_SI, K_SI, clamp
+from .barnes_hut import bh_forces
+from .pm import pm_forces
+from .kernels import tiled_forces, symmetric_forces
+from .kernels import yukawa_pair_forces
+from .spatial import min_separation, VerletList
+from .collisions import body_radius, merge
+from .profiling import Profiler, profiled
+
+# Yoshida (1990): composizione simmetrica di 3 leapfrog -> 4° ordine
+_YOSHIDA_W1 = 1.0 / (2.0 - 2.0**(1.0/3.0))
+_YOSHIDA_W0 = 1.0 - 2.0*_YOSHIDA_W1
 
 class PhysicsConfig:
     def __init__(self,
@@ -11,7 +22,26 @@ class PhysicsConfig:
                  yukawa_alpha=0.1,
                  drag=False,
                  drag_gamma=0.0,
-                 softening=1e3):
+                 softening=1e3,
+                 solver="tiled",      # "tiled" (diretto a blocchi) | "direct" (N^2 denso) | "bh" (Barnes–Hut) | "pm" (mesh FFT)
+                 theta=0.5,           # angolo di apertura Barnes–Hut
+                 leaf_size=8,         # particelle max per foglia dell'octree
+                 tile_size=64,        # righe per blocco del kernel diretto
+                 symmetric=True,      # kernel a blocchi: ogni coppia una volta (Newton III)
+                 integrator="rk4",    # "rk4" | "leapfrog" (KDK) | "yoshida4" | "block"
+                 block_dt=10.0,       # passo del blocco (bin più lento) per integrator="block"
+                 block_levels=8,      # numero di bin a potenze di 2: dt_min = block_dt/2^(levels-1)
+                 block_eta=0.02,      # criterio tipo Aarseth: dt_i = eta*|a_i|/|da_i/dt|
+                 precision="float64", # "float64" | "mixed" (unità interne, kernel float32)
+                 workers=0,           # >1: pool di processi su memoria condivisa
+                 yukawa_rcut=0.0,     # >0: Yukawa troncato a rcut*yukawa_lambda con lista di Verlet
+                 verlet_skin=0.5,     # guscio della lista di Verlet, in unità di yukawa_lambda
+                 periodic=False,      # posizioni riportate in [0, box_size)^3 a fine passo
+                 box_size=0.0,        # lato del box periodico (richiesto da solver="pm")
+                 pm_mesh=64,          # celle per lato della mesh particle-mesh
+                 collisions=False,    # fusione anelastica dei corpi sovrapposti a fine passo
+                 collision_radius=0.1, # raggio = collision_radius * cbrt(m), come Entity
+                 diag_every=0):       # diagnostiche (energia, momenti) ogni n passi, 0 = spente
         self.grav = grav
         self.coulomb = coulomb
         self.yukawa = yukawa
@@ -20,33 +50,168 @@ class PhysicsConfig:
         self.drag = drag
         self.drag_gamma = drag_gamma
         self.softening = softening
+        self.solver = solver
+        self.theta = theta
+        self.leaf_size = leaf_size
+        self.tile_size = tile_size
+        self.symmetric = symmetric
+        self.integrator = integrator
+        self.block_dt = block_dt
+        self.block_levels = block_levels
+        self.block_eta = block_eta
+        self.precision = precision
+        self.workers = workers
+        self.yukawa_rcut = yukawa_rcut
+        self.verlet_skin = verlet_skin
+        self.periodic = periodic
+        self.box_size = box_size
+        self.pm_mesh = pm_mesh
+        self.collisions = collisions
+        self.collision_radius = collision_radius
+        self.diag_every = diag_every
+
+    @classmethod
+    def from_dict(cls, d):
+        # blocco "physics" degli scenari JSON; chiavi sconosciute ignorate
+        known = cls.__init__.__code__.co_varnames[1:cls.__init__.__code__.co_argcount]
+        return cls(**{k: v for k, v in (d or {}).items() if k in known})
 
 class PhysicsCore:
     """
     Stato come array strutturati (pos[N,3], vel[N,3], m[N], q[N]).
     Force-model: Gravità Newtoniana, Coulomb, Yukawa opzionale, Drag lineare.
-    Integrazione RK4 con dt adattivo (CFL-like semplice).
+    Solver: somma diretta (densa o a blocchi di righe, memoria O(N*tile)),
+    Barnes–Hut O(N log N) oppure particle-mesh periodico O(N + M^3 log M) per gravità/Coulomb.
+    Integrazione RK4 oppure simplettica (leapfrog KDK, Yoshida-4) con dt adattivo (CFL-like semplice);
+    in alternativa passi a blocchi gerarchici per particella (integrator="block").
     """
-    def __init__(self, pos, vel, mass, charge=None, cfg: PhysicsConfig = None):
+    def __init__(self, pos, vel, mass, charge=None, cfg: PhysicsConfig = None, units=None):
         self.pos = np.asarray(pos, dtype=np.float64)   # (N,3)
         self.vel = np.asarray(vel, dtype=np.float64)   # (N,3)
         self.mass = np.asarray(mass, dtype=np.float64) # (N,)
         self.charge = np.zeros_like(self.mass) if charge is None else np.asarray(charge, dtype=np.float64)
         self.N = self.pos.shape[0]
         self.cfg = cfg or PhysicsConfig()
+        # units: UnitSystem se lo stato è in unità interne (cfg già scalata), None = SI
+        self.units = units
+        self.G = units.G if units else G_SI
+        self.K = units.K if units else K_SI
+        self.kernel_dtype = np.float32 if self.cfg.precision == "mixed" else np.float64
 
         # sanity
         assert self.pos.shape == (self.N,3)
         assert self.vel.shape == (self.N,3)
         assert self.mass.shape == (self.N,)
         assert self.charge.shape == (self.N,)
+        if (self.cfg.periodic or self.cfg.solver == "pm") and not self.cfg.box_size > 0:
+            raise ValueError("box_size richiesto per solver='pm' / periodic=True")
+        if self.cfg.solver == "bh" and not 0.0 < self.cfg.theta < 2.0 / np.sqrt(3.0):
+            # theta >= 2/sqrt(3): la cella stessa del corpo risulterebbe "lontana"
+            raise ValueError(f"theta deve essere in (0, 2/sqrt(3)): {self.cfg.theta}")
+
+        # accelerazioni conservative alla posizione corrente (riuso tra step KDK)
+        self._acc = None
+        self._acc_pos = None
+        # passi a blocchi: durata del passo di ogni particella in tick del blocco
+        self._block_n = None
+        self._pool = None
+        self._nlist = None      # lista di Verlet per Yukawa a corto raggio
+        self.merged = 0         # corpi eliminati da fusioni
+        # diagnostica: se want_potential, il prossimo calcolo completo delle forze (qualunque
+        # solver, anche sul pool) registra anche l'energia potenziale in _pot alle posizioni
+        # _pot_pos; con rk4 è quello di k1, allo stato di inizio passo (_pot_pos, _pot_vel)
+        self.want_potential = False
+        self._pot = None
+        self._pot_pos = None
+        self._pot_vel = None
+        self.prof = Profiler()  # disattivato: costo trascurabile (Universe lo sostituisce col proprio)
 
     def _pairwise_diffs(self, x):
         # x: (N,3) -> dx[i,j,3] = x[j]-x[i]
         return x[np.newaxis,:,:] - x[:,np.newaxis,:]  # (N,N,3)
 
     def _forces(self, pos, vel):
-        N = self.N
+        F = self._conservative_forces(pos)
+        if self.cfg.drag:
+            # Fd = -gamma * v
+            F += -self.cfg.drag_gamma * vel
+        return F
+
+    def _short_range(self):
+        return self.cfg.yukawa and self.cfg.yukawa_rcut > 0
+
+    @profiled("forces")
+    def _conservative_forces(self, pos, rows=None):
+        # rows: solo le forze su questi bersagli (sorgenti sempre tutte)
+        if self.prof.enabled:
+            self.prof.count("force_evals")
+            self.prof.count("force_rows", self.N if rows is None else len(rows))
+            self.prof.note_bytes("forces", self._force_bytes(rows))
+        pot = np.zeros(1) if self.want_potential and rows is None else None
+        if self.cfg.workers > 1:
+            F = self._force_pool().forces(pos, rows, pot=pot)
+        else:
+            F = self._kernel_forces(pos, rows, pot=pot)
+        if pot is not None:
+            self._pot, self._pot_pos = float(pot[0]), pos
+        if self._short_range():
+            Fs = self._short_range_forces(pos)
+            F += Fs if rows is None else Fs[rows]
+        return F
+
+    def _force_bytes(self, rows=None):
+        # stima dei byte temporanei di una valutazione (array di lavoro del solver)
+        cfg, N = self.cfg, self.N
+        n = N if rows is None else len(rows)
+        item = np.dtype(self.kernel_dtype).itemsize
+        if cfg.solver == "direct" and rows is None:
+            return N*N*8*7                          # dx (N,N,3) + r2, inv_r3, coef, mprod
+        if cfg.solver == "bh":
+            return N*8*16 + min(n, 4096)*8*24       # nodi dell'octree + blocco di traversata
+        if cfg.solver == "pm":
+            return cfg.pm_mesh**3*8*5 + N*8*16      # mesh + 3 componenti + 8 vertici CIC
+        return min(n, cfg.tile_size)*N*item*7       # blocco (tile,N): dx + r2, inv_r3, coef
+
+    @profiled("forces.short_range")
+    def _short_range_forces(self, pos):
+        # Yukawa entro rcut: O(N) con lista di Verlet (ricostruita solo oltre skin/2)
+        cfg = self.cfg
+        rc = cfg.yukawa_rcut * cfg.yukawa_lambda
+        if self._nlist is None:
+            self._nlist = VerletList(rc, cfg.verlet_skin * cfg.yukawa_lambda)
+        i, j = self._nlist.pairs(pos)
+        return yukawa_pair_forces(pos, i, j, cfg, rc)
+
+    @profiled("forces.kernel")
+    def _kernel_forces(self, pos, rows=None, pot=None):
+        # gravità/Coulomb (+ Yukawa se non troncato) con il solver configurato;
+        # pot: accumula il potenziale delle righe (metà per coppia: su tutte le righe è U)
+        cfg = self.cfg
+        yk = cfg.yukawa and not self._short_range()
+        if not (cfg.grav or cfg.coulomb or yk):
+            return np.zeros((self.N if rows is None else len(rows), 3))
+        m, q = self.mass, self.charge
+        kw = dict(G=self.G, K=self.K)
+        if cfg.solver in ("bh", "pm"):
+            # potenziale con le stesse approssimazioni delle forze (albero / mesh periodica)
+            solve = bh_forces if cfg.solver == "bh" else pm_forces
+            F = solve(pos, m, q, cfg, rows=rows, pot=pot, **kw)
+            if yk:
+                # Yukawa non ha sviluppo in multipoli: resta a somma diretta
+                F += tiled_forces(pos, m, q, cfg, grav=False, yukawa=True, rows=rows,
+                                  dtype=self.kernel_dtype, **kw)
+        elif rows is not None:
+            F = tiled_forces(pos, m, q, cfg, cfg.grav, cfg.coulomb, yk, rows=rows,
+                             dtype=self.kernel_dtype, pot=pot, **kw)
+        elif cfg.solver == "direct":
+            F = self._direct_forces(pos, cfg.grav, cfg.coulomb, yk, pot=pot)
+        else:
+            kernel = symmetric_forces if cfg.symmetric else tiled_forces
+            F = kernel(pos, m, q, cfg, cfg.grav, cfg.coulomb, yk,
+                       dtype=self.kernel_dtype, pot=pot, **kw)
+        return F
+
+    def _direct_forces(self, pos, grav, coulomb, yukawa, pot=None):
         dx = self._pairwise_diffs(pos)                  # (N,N,3)
         r2 = np.sum(dx*dx, axis=-1) + (self.cfg.softening**2) # (N,N)
         inv_r3 = r2**(-1.5)
@@ -56,21 +221,30 @@ class PhysicsCore:
 
         F = np.zeros_like(pos)
 
-        if self.cfg.grav:
+        if grav:
             # Fg_i = G * sum_j m_i m_j * (x_j - x_i)/|r|^3
             mprod = self.mass[:,None] * self.mass[None,:]
-            coef = G_SI * mprod * inv_r3
+            coef = self.G * mprod * inv_r3
             Fg = np.einsum('ij,ijc->ic', coef, dx)
             F += Fg
 
-        if self.cfg.coulomb:
+        if coulomb:
             # Fe_i = (1/(4π eps0)) * qi qj * (x_j - x_i)/|r|^3
             qprod = self.charge[:,None] * self.charge[None,:]
-            coef = (1.0/(4.0*np.pi*EPS0_SI)) * qprod * inv_r3
+            coef = self.K * qprod * inv_r3
             Fe = np.einsum('ij,ijc->ic', coef, dx)
             F += Fe
 
-        if self.cfg.yukawa:
+        if pot is not None and (grav or coulomb):
+            # U = -1/2 sum_{i!=j} (G m_i m_j + K q_i q_j) / r_ij  (diagonale già a zero in inv_r3)
+            c = 0.0
+            if grav:
+                c = self.G * mprod
+            if coulomb:
+                c = c + self.K * qprod
+            pot[0] -= 0.5 * np.sum(c * inv_r3 * r2)
+
+        if yukawa:
             # Yukawa approx: Fy ~ alpha * (x_j-x_i)/r^3 * exp(-r/lambda)
             r = np.sqrt(r2)
             np.fill_diagonal(r, 1.0)   # avoid exp(-0) for diag, not used
@@ -79,10 +253,6 @@ class PhysicsCore:
             Fy = np.einsum('ij,ijc->ic', coef, dx)
             F += Fy
 
-        if self.cfg.drag:
-            # Fd = -gamma * v
-            F += -self.cfg.drag_gamma * vel
-
         return F
 
     def _derivatives(self, state):
@@ -94,27 +264,177 @@ class PhysicsCore:
     def _rk4_step(self, dt):
         pos0, vel0 = self.pos, self.vel
 
+        self._pot_vel = None
         k1_v, k1_a = self._derivatives((pos0, vel0))
+        if self._pot_pos is pos0:
+            # potenziale di k1: campione diagnostico dello stato di inizio passo
+            self._pot_vel = vel0
+            self.want_potential = False
         k2_v, k2_a = self._derivatives((pos0 + 0.5*dt*k1_v, vel0 + 0.5*dt*k1_a))
         k3_v, k3_a = self._derivatives((pos0 + 0.5*dt*k2_v, vel0 + 0.5*dt*k2_a))
         k4_v, k4_a = self._derivatives((pos0 + dt*k3_v, vel0 + dt*k3_a))
 
-        self.pos = pos0 + (dt/6.0)*(k1_v + 2*k2_v + 2*k3_v + k4_v)
-        self.vel = vel0 + (dt/6.0)*(k1_a + 2*k2_a + 2*k3_a + k4_a)
+        with self.prof.phase("rk4.combine"):
+            self.pos = pos0 + (dt/6.0)*(k1_v + 2*k2_v + 2*k3_v + k4_v)
+            self.vel = vel0 + (dt/6.0)*(k1_a + 2*k2_a + 2*k3_a + k4_a)
+
+    def _accel(self, pos):
+        acc = self._conservative_forces(pos) / self.mass[:,None]
+        self._acc, self._acc_pos = acc, pos
+        return acc
+
+    def _current_accel(self):
+        if self._acc_pos is self.pos and self._acc is not None:
+            return self._acc
+        return self._accel(self.pos)
+
+    def _force_pool(self):
+        from .parallel import ForcePool
+        if self._pool is not None and (self._pool.N != self.N or self._pool.W != self.cfg.workers):
+            self.close()
+        if self._pool is None:
+            self._pool = ForcePool(self.pos, self.mass, self.charge, self.cfg, self.cfg.workers, self.units)
+        elif self._pool.cfg != vars(self.cfg):
+            # cfg sostituita o modificata (softening, solver, theta, ...): i worker la ricevono
+            self._pool.set_config(self.cfg)
+        return self._pool
+
+    def close(self):
+        # termina i worker del pool (se attivo)
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
 
+    def invalidate(self):
+        # da chiamare se pos/mass/charge vengono modificati fuori dagli integratori
+        self._acc = None
+        self._acc_pos = None
+        self._block_n = None
+        self._nlist = None
+        self._pot_pos = None
+        self._pot_vel = None
+        if self._pool is not None and self._pool.N == self.N:
+            self._pool.set_sources(self.mass, self.charge)
+
+    def _kick(self, vel, acc, h, idx=slice(None)):
+        # h scalare oppure (n,1) per particella; idx seleziona le masse di vel/acc
+        if not (self.cfg.drag and self.cfg.drag_gamma):
+            return vel + h*acc
+        # soluzione esatta di dv/dt = a - (gamma/m) v su un intervallo h
+        c = (self.cfg.drag_gamma / self.mass[idx])[:,None]
+        return vel*np.exp(-c*h) + acc*(-np.expm1(-c*h)/c)
+
+    def _kdk(self, dt):
+        # leapfrog kick-drift-kick: una valutazione di forze per step
+        vel = self._kick(self.vel, self._current_accel(), 0.5*dt)
+        pos = self.pos + dt*vel
+        self.vel = self._kick(vel, self._accel(pos), 0.5*dt)
+        self.pos = pos
+
+    def _yoshida4_step(self, dt):
+        for w in (_YOSHIDA_W1, _YOSHIDA_W0, _YOSHIDA_W1):
+            self._kdk(w*dt)
+
+    def _block_bins(self, acc, jerk, tick, T, t_now):
+        # dt_i = eta*|a|/|jerk| arrotondato per difetto a potenza di 2 di tick,
+        # allineato a t_now (un bin può crescere solo su un multiplo di sé stesso)
+        a = np.linalg.norm(acc, axis=1)
+        j = np.linalg.norm(jerk, axis=1)
+        dt_i = self.cfg.block_eta * np.divide(a, j, out=np.full_like(a, np.inf), where=j > 0)
+        ticks = np.clip(dt_i / tick, 1.0, T)
+        n = (2 ** np.floor(np.log2(ticks))).astype(np.int64)
+        while True:
+            bad = (t_now % n != 0) | (t_now + n > T)
+            if not bad.any():
+                return n
+            n[bad] //= 2
+
+    def _block_step(self, dt):
+        """
+        Un blocco di durata dt con bin per particella dt/2^k (KDK gerarchico).
+        Ad ogni evento si derivano tutte le posizioni, ma le forze si calcolano
+        solo per le particelle attive che chiudono il proprio passo.
+        """
+        T = 2 ** (self.cfg.block_levels - 1)   # tick per blocco
+        tick = dt / T
+        acc = self._current_accel()
+        if self._block_n is None:
+            # bin iniziali: jerk stimato con una derivata in avanti lungo v
+            probe = self._conservative_forces(self.pos + tick*self.vel) / self.mass[:,None]
+            self._block_n = self._block_bins(acc, (probe - acc)/tick, tick, T, 0)
+        n = self._block_n
+        start = np.zeros(self.N, dtype=np.int64)
+        vel = self._kick(self.vel, acc, (0.5*tick*n)[:,None])
+        pos = self.pos.copy()
+        acc = acc.copy()
+        t = 0
+        while t < T:
+            t_next = int(np.min(start + n))
+            pos += vel * ((t_next - t)*tick)
+            t = t_next
+            act = np.flatnonzero(start + n == t)
+            # a fine blocco sono attive tutte: valutazione completa (registra anche il potenziale)
+            a_new = self._conservative_forces(pos, rows=None if act.size == self.N else act)
+            a_new /= self.mass[act][:,None]
+            h = (tick*n[act])[:,None]
+            vel[act] = self._kick(vel[act], a_new, 0.5*h, act)
+            jerk = (a_new - acc[act]) / h
+            acc[act] = a_new
+            n[act] = self._block_bins(a_new, jerk, tick, T, t if t < T else 0)
+            if t < T:
+                start[act] = t
+                vel[act] = self._kick(vel[act], a_new, (0.5*tick*n[act])[:,None], act)
+        self.pos, self.vel = pos, vel
+        self._acc, self._acc_pos = acc, pos
+        self._block_n = n
+
+    @profiled("suggest_dt")
     def suggest_dt(self, dt_max=10.0, safety=0.4):
         # Heuristica: basato su max velocità e min distanza tra particelle
+        # (rmin via griglia spaziale, senza matrice NxN delle distanze)
         v = np.linalg.norm(self.vel, axis=1)
         vmax = max(1e-6, np.max(v))
-        dx = self._pairwise_diffs(self.pos)
-        r = np.sqrt(np.sum(dx*dx, axis=-1))
-        r[r==0] = np.inf
-        rmin = np.min(r)
+        rmin = min_separation(self.pos)
         dt = safety * rmin / vmax
-        return clamp(dt, 1e-4, dt_max)
+        # limiti in secondi -> unità di tempo dello stato
+        ts = self.units.T if self.units else 1.0
+        return clamp(dt, 1e-4 / ts, dt_max / ts)
 
+    @profiled("step")
     def step(self, dt=None):
-        if dt is None:
-            dt = self.suggest_dt()
-        self._rk4_step(dt)
+        if self.cfg.integrator == "block":
+            dt = self.cfg.block_dt if dt is None else dt
+            self._block_step(dt)
+        else:
+            if dt is None:
+                dt = self.suggest_dt()
+            if self.cfg.integrator == "leapfrog":
+                self._kdk(dt)
+            elif self.cfg.integrator == "yoshida4":
+                self._yoshida4_step(dt)
+            else:
+                self._rk4_step(dt)
+        if self.cfg.periodic:
+            np.mod(self.pos, self.cfg.box_size, out=self.pos)
+            if self.cfg.solver != "pm":
+                self._pot_pos = None    # il potenziale PM è periodico: resta valido
+            if self.cfg.solver != "pm" or self._short_range():
+                # solo le forze PM sono periodiche: le altre cambiano col riavvolgimento
+                self._acc_pos = None
+        if self.cfg.collisions:
+            self._collide()
         return dt
+
+    @profiled("collisions")
+    def _collide(self):
+        # fusione dei corpi sovrapposti; gli array vengono compattati (N diminuisce)
+        out = merge(self.pos, self.vel, self.mass, self.charge,
+                    body_radius(self.mass, self.cfg.collision_radius))
+        if out is None:
+            return 0
+        self.pos, self.vel, self.mass, self.charge, keep = out
+        lost = self.N - keep.size
+        self.N = keep.size
+        self.merged += lost
+        self.invalidate()
+        return lost
@@ -0,0 +1,86 @@
+# TheLight24 v6 – Profiling per fase: timer, contatori, stima byte, percentili su finestra mobile
+import functools
+from collections import Counter, deque
+from contextlib import nullcontext
+from time import perf_counter
+import numpy as np
+
+_NULL = nullcontext()
+
+class _Timer:
+    __slots__ = ("prof", "name", "t0")
+
+    def __init__(self, prof, name):
+        self.prof, self.name = prof, name
+
+    def __enter__(self):
+        self.t0 = perf_counter()
+
+    def __exit__(self, *exc):
+        self.prof.record(self.name, perf_counter() - self.t0)
+
+class Profiler:
+    """
+    Durate per fase (inclusive: "step" contiene "forces") sulle ultime `window` chiamate,
+    contatori cumulativi e stime dei byte di lavoro (ultimo valore e massimo).
+    Disattivato: phase() restituisce un contesto nullo e i metodi @profiled un solo test di flag.
+    """
+    def __init__(self, window=256, enabled=False):
+        self.window = window
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.times = {}
+        self.totals = Counter()
+        self.calls = Counter()
+        self.counts = Counter()
+        self.bytes_last = {}
+        self.bytes_max = Counter()
+
+    def phase(self, name):
+        return _Timer(self, name) if self.enabled else _NULL
+
+    def record(self, name, seconds):
+        if name not in self.times:
+            self.times[name] = deque(maxlen=self.window)
+        self.times[name].append(seconds)
+        self.totals[name] += seconds
+        self.calls[name] += 1
+
+    def count(self, name, k=1):
+        self.counts[name] += k
+
+    def note_bytes(self, name, nbytes):
+        self.bytes_last[name] = int(nbytes)
+        self.bytes_max[name] = max(self.bytes_max[name], int(nbytes))
+
+    def report(self):
+        phases = {}
+        for name, d in self.times.items():
+            p50, p90, p99 = np.percentile(np.fromiter(d, dtype=np.float64), [50, 90, 99])
+            phases[name] = {"calls": self.calls[name], "total_s": self.totals[name],
+                            "last_s": d[-1], "p50_s": p50, "p90_s": p90, "p99_s": p99}
+        return {
+            "enabled": self.enabled,
+            "window": self.window,
+            "phases": phases,
+            "counts": dict(self.counts),
+            "bytes": {k: {"last": v, "max": self.bytes_max[k]} for k, v in self.bytes_last.items()},
+        }
+
+def profiled(name):
+    """Decoratore per metodi di oggetti con attributo `prof` (Profiler)."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(self, *args, **kwargs):
+            prof = self.prof
+            if not prof.enabled:
+                return fn(self, *args, **kwargs)
+            t0 = perf_counter()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                prof.record(name, perf_counter() - t0)
+        return inner
+    return wrap
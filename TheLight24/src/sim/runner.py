@@ -0,0 +1,150 @@
+# TheLight24 v6 – Runner in background: integra un Universe in un thread dedicato (passi/s o massima velocità)
+import threading, time
+from .universe import StepStats
+
+class SimRunner:
+    """
+    Thread che avanza `universe` a `rate` passi/s (0 = più veloce possibile) con passo `dt`
+    (None = adattivo). Ogni modifica all'Universe (passo, load, restore, ...) passa da `lock`.
+    Doppio buffer: dopo un passo (al più ogni `publish_interval` s) lo stato SI viene copiato
+    in un frame nuovo e pubblicato con un solo scambio di riferimento; chi legge prende il frame
+    pubblicato senza attendere il lock, e il frame non viene più modificato dopo lo scambio.
+    """
+    def __init__(self, universe, rate=0.0, dt=None, publish_interval=0.05):
+        self.universe = universe
+        self.rate = float(rate)
+        self.dt = dt
+        self.publish_interval = publish_interval
+        self.lock = threading.RLock()
+        self.steps = 0
+        self.error = None           # ultima eccezione del thread (ferma il runner)
+        self._front = None          # frame pubblicato (in lettura)
+        self._published_at = 0.0
+        self._running = threading.Event()
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = None
+        self._rate_est = 0.0        # passi/s misurati (media mobile esponenziale)
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def run(self, rate=None, dt=None):
+        if rate is not None:
+            self.set_rate(rate)
+        if dt is not None:
+            self.dt = dt if dt > 0 else None
+        self.error = None
+        self._running.set()
+        self._wake.set()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = False
+            self._thread = threading.Thread(target=self._loop, name="sim-runner", daemon=True)
+            self._thread.start()
+
+    def pause(self):
+        # ritorna a passo concluso: dopo pause() il thread non tocca più l'Universe
+        self._running.clear()
+        with self.lock:
+            self.publish()
+
+    def set_rate(self, rate):
+        if rate < 0:
+            raise ValueError("rate deve essere >= 0 (0 = più veloce possibile)")
+        self.rate = float(rate)
+        self._wake.set()
+
+    def close(self):
+        self._stop = True
+        self._running.clear()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def apply(self, fn, *args, **kwargs):
+        """Esegue fn sull'Universe in esclusiva col runner e ripubblica lo stato."""
+        with self.lock:
+            result = fn(*args, **kwargs)
+            self.publish()
+            return result
+
+    def advance(self, steps=None, until_t=None, dt=None, every=1000):
+        """
+        Generatore per /sim/step: integra a blocchi di `every` passi (lock preso e rilasciato
+        per blocco, così runner e altre richieste si alternano) e dopo ogni blocco produce le
+        statistiche cumulative; l'ultimo elemento ha "done": True.
+        """
+        if steps is None and until_t is None:
+            steps = 1
+        stats = StepStats()
+        left = steps
+        while True:
+            n = every if left is None else min(every, left)
+            with self.lock:
+                before = stats.steps
+                self.universe.advance(n, until_t, dt, stats)
+                self.publish()
+                t = self.universe.t
+            done = stats.steps - before
+            if left is not None:
+                left -= done
+            finished = done < n or left == 0
+            yield {**stats.as_dict(), "t": t, "done": finished}
+            if finished:
+                return
+
+    def publish(self):
+        # back buffer: copie SI costruite fuori dalla vista dei lettori, poi scambio atomico
+        self._front = self.universe.frame()
+        self._published_at = time.perf_counter()
+
+    def frame(self):
+        """Ultimo frame pubblicato (dict di array da non modificare), {} se nessuno scenario."""
+        front = self._front
+        if front is None:
+            with self.lock:
+                if self._front is None:
+                    self.publish()
+                front = self._front
+        return front
+
+    def status(self):
+        return {"running": self.running, "rate": self.rate, "dt": self.dt, "steps": self.steps,
+                "steps_per_s": self._rate_est, "error": self.error}
+
+    def _loop(self):
+        next_t = time.perf_counter()
+        last = None
+        while not self._stop:
+            if not self._running.wait(0.1):
+                last = None
+                continue
+            with self.lock:
+                if not self._running.is_set():
+                    # pause() arrivato mentre si attendeva il lock: niente passo
+                    last = None
+                    continue
+                if self.universe.core is None:
+                    self._running.clear()
+                    continue
+                try:
+                    self.universe.step(self.dt)
+                except Exception as e:      # stato non più integrabile: ferma il runner, l'API lo riporta
+                    self.error = f"{type(e).__name__}: {e}"
+                    self._running.clear()
+                    continue
+                self.steps += 1
+                now = time.perf_counter()
+                if now - self._published_at >= self.publish_interval or self.rate > 0:
+                    self.publish()
+            if last is not None and now > last:
+                self._rate_est = 0.9*self._rate_est + 0.1/(now - last) if self._rate_est else 1.0/(now - last)
+            last = now
+            if self.rate > 0:
+                next_t = max(next_t + 1.0/self.rate, now - 1.0)     # ritardo oltre 1 s non recuperato
+                self._wake.clear()
+                self._wake.wait(max(0.0, next_t - time.perf_counter()))
+            else:
+                next_t = now
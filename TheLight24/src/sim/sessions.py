@@ -0,0 +1,497 @@
+# TheLight24 v6 – Sessioni: un Universe per chiave in un processo worker, limiti e sospensione LRU su checkpoint
+import multiprocessing as mp
+import os, re, threading
+from collections import OrderedDict
+from .universe import Universe
+from .runner import SimRunner
+
+class SessionLimitError(RuntimeError):
+    """Limite di sessioni o particelle non rispettabile (nessuna sessione inattiva da sospendere)."""
+
+class SessionHost:
+    """
+    Comandi dell'API su un Universe e il suo SimRunner: nel processo del server (sessione
+    predefinita) o dentro un worker (SessionWorker inoltra le stesse chiamate via pipe).
+    """
+    def __init__(self, backend="numpy"):
+        self.universe = Universe(backend)
+        self.runner = SimRunner(self.universe)
+
+    def _loaded(self):
+        if self.universe.core is None:
+            raise RuntimeError("Nessuno scenario caricato")
+        return self.universe
+
+    def load(self, path, backend=None):
+        U = self.universe
+        def _load():
+            if backend is not None:
+                U.backend = backend
+            U.load(path)
+        self.runner.apply(_load)
+        return {"backend": U.backend, "N": U.core.N}
+
+    def advance(self, steps=None, until_t=None, dt=None, every=1000):
+        # validazione immediata, poi il generatore di avanzamento
+        if steps is not None or until_t is not None:
+            self._loaded()
+        return self.runner.advance(steps, until_t, dt, every)
+
+    def frame(self):
+        return self.runner.frame()
+
+    def status(self):
+        U = self.universe
+        return {"t": U.t, "loaded": U.core is not None, "N": 0 if U.core is None else U.core.N,
+                "backend": U.backend, "diagnostics": U.diagnostics(), "runner": self.runner.status()}
+
+    def save_checkpoint(self, path):
+        U = self._loaded()
+        self.runner.apply(U.save_checkpoint, path)
+        return {"t": U.t, "N": U.core.N}
+
+    def load_checkpoint(self, path):
+        U = self.universe
+        self.runner.apply(U.load_checkpoint, path)
+        return {"t": U.t, "N": U.core.N, "backend": U.backend}
+
+    def record(self, path, capacity, stride=1):
+        U = self._loaded()
+        self.runner.apply(U.record, path, capacity, stride)
+
+    def stop_recording(self):
+        with self.runner.lock:
+            rec = self.universe.recorder
+            self.universe.stop_recording()
+        return 0 if rec is None else rec.count
+
+    def recording_path(self):
+        rec = self.universe.recorder
+        return None if rec is None else rec.path
+
+    def run(self, rate=None, dt=None):
+        self._loaded()
+        self.runner.run(rate, dt)
+        return self.runner.status()
+
+    def pause(self):
+        self.runner.pause()
+        return self.runner.status()
+
+    def set_rate(self, rate):
+        self.runner.set_rate(rate)
+        return self.runner.status()
+
+    def metrics(self, enabled=None, reset=False):
+        prof = self.universe.prof
+        if enabled is not None:
+            prof.enabled = enabled
+        if reset:
+            prof.reset()
+        return prof.report()
+
+    def close(self):
+        self.runner.close()
+        with self.runner.lock:
+            self.universe.stop_recording()
+            if self.universe.core is not None:
+                self.universe.core.close()
+
+def _serve_frames(conn, host):
+    # canale laterale: ultimo frame pubblicato dal runner, senza attendere i comandi in corso
+    try:
+        while conn.recv() is not None:
+            conn.send(host.frame())
+    except (EOFError, OSError):
+        pass
+
+def _worker(conn, frames, backend):
+    host = SessionHost(backend)
+    threading.Thread(target=_serve_frames, args=(frames, host), name="session-frames", daemon=True).start()
+    try:
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            name, args, kwargs = msg
+            try:
+                result = getattr(host, name)(*args, **kwargs)
+                if name == "advance":
+                    # avanzamento a blocchi: un messaggio per blocco, poi "end"
+                    for p in result:
+                        conn.send(("item", p))
+                    result = None
+                conn.send(("ok", result))
+            except Exception as e:
+                try:
+                    conn.send(("err", e))
+                except Exception:   # eccezione non serializzabile
+                    conn.send(("err", RuntimeError(f"{type(e).__name__}: {e}")))
+    finally:
+        host.close()
+
+class _Progress:
+    """
+    Iteratore sull'avanzamento di un SessionWorker: tiene il lock della sessione fino
+    all'ultimo messaggio. close() (anche se l'iteratore non è mai partito, es. client
+    disconnesso prima della prima lettura) consuma i messaggi rimasti e rilascia il lock.
+    """
+    def __init__(self, worker, first):
+        self._worker = worker
+        self._msg = first       # messaggio ricevuto e non ancora restituito
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        try:
+            msg = self._worker._recv() if self._msg is None else self._msg
+        except BaseException:
+            self._finish()
+            raise
+        self._msg = None
+        if msg[0] != "item":
+            self._finish()
+            raise StopIteration
+        return msg[1]
+
+    def close(self):
+        if self._done:
+            return
+        try:
+            # la corsa nel worker prosegue comunque: i messaggi rimasti vanno consumati
+            msg = self._msg
+            while msg is None or msg[0] == "item":
+                msg = self._worker._recv()
+        except Exception:
+            pass
+        finally:
+            self._finish()
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._msg = None
+            self._worker._lock.release()
+
+    def __del__(self):
+        self.close()
+
+class SessionWorker:
+    """
+    Processo dedicato con un SessionHost: stessi comandi, inoltrati su una pipe (una
+    chiamata alla volta). frame() usa una seconda pipe servita da un thread del worker:
+    come per la sessione predefinita, snapshot e stream non attendono un /sim/step lungo.
+    `N` e `running` sono in cache per le decisioni del registro
+    (running aggiornato anche da status(): il runner può fermarsi da solo su un errore).
+    """
+    COMMANDS = ("record", "stop_recording", "recording_path", "set_rate", "metrics")
+
+    def __init__(self, backend="numpy"):
+        ctx = mp.get_context("spawn")   # niente fork di un processo con thread (FastAPI)
+        self._conn, child = ctx.Pipe()
+        self._frames, child_frames = ctx.Pipe()
+        self._proc = ctx.Process(target=_worker, args=(child, child_frames, backend), daemon=True)
+        self._proc.start()
+        child.close()
+        child_frames.close()
+        self._lock = threading.Lock()
+        self._frame_lock = threading.Lock()     # solo per la pipe dei frame (richieste brevi)
+        self.N = 0
+        self.running = False
+        self.closed = False
+
+    @property
+    def busy(self):
+        return self._lock.locked()
+
+    @property
+    def alive(self):
+        return not self.closed and self._proc.is_alive()
+
+    def _recv(self):
+        try:
+            kind, value = self._conn.recv()
+        except (EOFError, OSError):
+            self.closed = True
+            raise RuntimeError("Processo della sessione terminato")
+        if kind == "err":
+            raise value
+        return kind, value
+
+    def call(self, name, *args, **kwargs):
+        with self._lock:
+            return self._call(name, *args, **kwargs)
+
+    def _call(self, name, *args, **kwargs):
+        # con _lock già preso (call, o il registro che sospende la sessione)
+        if self.closed:
+            raise RuntimeError("Sessione sospesa: ripetere la richiesta")
+        self._conn.send((name, args, kwargs))
+        return self._recv()[1]
+
+    def frame(self):
+        with self._frame_lock:
+            if self.closed:
+                raise RuntimeError("Sessione sospesa: ripetere la richiesta")
+            try:
+                self._frames.send(True)
+                return self._frames.recv()
+            except (EOFError, OSError):
+                raise RuntimeError("Processo della sessione terminato")
+
+    def __getattr__(self, name):
+        if name in SessionWorker.COMMANDS:
+            return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    def load(self, path, backend=None):
+        r = self.call("load", path, backend)
+        self.N = r["N"]
+        return r
+
+    def load_checkpoint(self, path):
+        r = self.call("load_checkpoint", path)
+        self.N = r["N"]
+        return r
+
+    def save_checkpoint(self, path):
+        return self.call("save_checkpoint", path)
+
+    def status(self):
+        r = self.call("status")
+        self.running = r["runner"]["running"]
+        return r
+
+    def run(self, rate=None, dt=None):
+        r = self.call("run", rate, dt)
+        self.running = r["running"]
+        return r
+
+    def pause(self):
+        r = self.call("pause")
+        self.running = False
+        return r
+
+    def advance(self, steps=None, until_t=None, dt=None, every=1000):
+        # il primo messaggio arriva prima di ritornare: gli errori di validazione emergono subito
+        self._lock.acquire()
+        try:
+            if self.closed:
+                raise RuntimeError("Sessione sospesa: ripetere la richiesta")
+            self._conn.send(("advance", (steps, until_t, dt, every), {}))
+            first = self._recv()
+        except BaseException:
+            self._lock.release()
+            raise
+        return _Progress(self, first)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self._proc.join(timeout=5.0)
+        if self._proc.is_alive():
+            self._proc.terminate()
+        self._conn.close()
+        with self._frame_lock:      # processo finito: un frame() in attesa ha già avuto EOF
+            self._frames.close()
+
+class SessionRegistry:
+    """
+    Sessioni per chiave, ognuna in un SessionWorker. Oltre `max_sessions` sessioni vive o
+    `max_particles` particelle totali, le sessioni inattive meno usate di recente (non in
+    esecuzione, nessuna richiesta in corso) vengono salvate in `checkpoint_dir` e chiuse;
+    al primo accesso successivo la sessione riparte dal checkpoint. Una registrazione di
+    traiettoria attiva termina con la sospensione.
+    `lock` protegge solo le tabelle: avvio dei processi, checkpoint e chiusure avvengono
+    fuori, con la sessione in `_transit` (chi la chiede nel frattempo attende).
+    """
+    def __init__(self, checkpoint_dir, max_sessions=8, max_particles=2_000_000, backend="numpy"):
+        self.checkpoint_dir = checkpoint_dir
+        self.max_sessions = max_sessions
+        self.max_particles = max_particles
+        self.backend = backend
+        self.lock = threading.Lock()
+        self._live = OrderedDict()      # chiave -> SessionWorker, dalla meno recente
+        self._transit = {}              # chiave -> Event: sessione in avvio o in sospensione
+        self._starting = 0              # avvii in corso (contano già per max_sessions)
+        self.evictions = 0
+        self.revivals = 0
+
+    def _path(self, sid):
+        if not re.fullmatch(r"[\w.-]+", sid):
+            raise ValueError(f"Sessione non valida: {sid}")
+        return os.path.join(self.checkpoint_dir, sid + ".npz")
+
+    def get(self, sid):
+        """Sessione viva per `sid`: esistente, ripresa dal checkpoint o nuova."""
+        path = self._path(sid)
+        dead, claimed = self._claim(sid, reuse=True)
+        if not claimed:
+            return dead
+        try:
+            if dead is not None:
+                dead.close()        # worker terminato: si riparte dall'ultimo checkpoint, se c'è
+            with self.lock:
+                self._starting += 1
+            try:
+                self._make_room(sid)
+                w = SessionWorker(self.backend)
+            finally:
+                with self.lock:
+                    self._starting -= 1
+            try:
+                revived = os.path.exists(path)
+                if revived:
+                    w.load_checkpoint(path)
+                with self.lock:
+                    self._live[sid] = w
+                if revived:
+                    self._make_room(sid)
+            except BaseException:
+                with self.lock:
+                    self._live.pop(sid, None)
+                w.close()
+                raise
+            if revived:
+                os.remove(path)     # lo stato vivo è ora quello del worker
+                with self.lock:
+                    self.revivals += 1
+            return w
+        finally:
+            self._release(sid)
+
+    def _claim(self, sid, reuse):
+        # (sessione viva, False) se reuse; altrimenti `sid` passa in _transit e ne esce il
+        # worker tolto dalla tabella (o None): (worker, True), da chiudere con _release
+        while True:
+            with self.lock:
+                w = self._live.get(sid)
+                if reuse and w is not None and w.alive:
+                    self._live.move_to_end(sid)
+                    return w, False
+                busy = self._transit.get(sid)
+                if busy is None:
+                    self._transit[sid] = threading.Event()
+                    return self._live.pop(sid, None), True
+            busy.wait()     # avvio o sospensione in corso da un'altra richiesta
+
+    def _release(self, sid):
+        with self.lock:
+            self._transit.pop(sid).set()
+
+    def admit(self, sid):
+        """Dopo load/restore (N cambiato): rispetta i limiti sospendendo le altre sessioni."""
+        with self.lock:
+            w = self._live.get(sid)
+            if w is None:
+                return
+            if w.N > self.max_particles:
+                self._live.pop(sid)
+            else:
+                w = None
+        if w is not None:
+            w.close()
+            raise SessionLimitError(f"{w.N} particelle: oltre il limite di {self.max_particles}")
+        self._make_room(sid)
+
+    def set_limits(self, max_sessions=None, max_particles=None):
+        # sospende subito quanto possibile; se restano sessioni attive oltre i limiti, lo farà il prossimo accesso
+        with self.lock:
+            if max_sessions is not None:
+                self.max_sessions = max_sessions
+            if max_particles is not None:
+                self.max_particles = max_particles
+        try:
+            self._make_room(None)
+        except SessionLimitError:
+            pass
+
+    def drop(self, sid):
+        path = self._path(sid)
+        w, _ = self._claim(sid, reuse=False)
+        try:
+            if w is not None:
+                w.close()
+            found = w is not None or os.path.exists(path)
+            if os.path.exists(path):
+                os.remove(path)
+        finally:
+            self._release(sid)
+        return found
+
+    def _over(self):
+        return (len(self._live) + self._starting > self.max_sessions
+                or sum(w.N for w in self._live.values()) > self.max_particles)
+
+    def _make_room(self, keep):
+        # sospende le sessioni inattive meno recenti finché i limiti sono rispettati. La vittima
+        # si sceglie sotto il lock del registro prendendo il suo lock (nessuna richiesta in corso);
+        # stato del runner, checkpoint e chiusura fuori dal lock del registro
+        skip = set()
+        while True:
+            with self.lock:
+                if not self._over():
+                    return
+                victim = None
+                for sid, w in self._live.items():
+                    if sid != keep and sid not in skip and w._lock.acquire(blocking=False):
+                        victim = sid
+                        break
+                if victim is None:
+                    raise SessionLimitError(f"Limiti raggiunti ({self.max_sessions} sessioni, "
+                                            f"{self.max_particles} particelle) e nessuna sessione inattiva")
+            try:
+                # running in cache può essere vecchio (runner fermato da un errore): si chiede al worker
+                w.running = w.alive and w._call("status")["runner"]["running"]
+            except RuntimeError:
+                w.running = False   # worker morto: sospeso senza checkpoint
+            with self.lock:
+                if w.running or self._live.get(victim) is not w or not self._over():
+                    w._lock.release()
+                    skip.add(victim)
+                    continue
+                self._live.pop(victim)
+                self._transit[victim] = threading.Event()
+            try:
+                self._evict(victim, w)
+            finally:
+                self._release(victim)
+
+    def _evict(self, sid, w):
+        # w._lock preso dal chiamante: nessun comando tra il checkpoint e la chiusura
+        try:
+            if w.N and w.alive:
+                os.makedirs(self.checkpoint_dir, exist_ok=True)
+                w._call("save_checkpoint", self._path(sid))
+        finally:
+            w.close()
+            w._lock.release()
+        with self.lock:
+            self.evictions += 1
+
+    def status(self):
+        with self.lock:
+            live = {sid: {"N": w.N, "running": w.running, "busy": w.busy} for sid, w in self._live.items()}
+        suspended = []
+        if os.path.isdir(self.checkpoint_dir):
+            suspended = sorted(f[:-4] for f in os.listdir(self.checkpoint_dir) if f.endswith(".npz"))
+        return {"max_sessions": self.max_sessions, "max_particles": self.max_particles,
+                "particles": sum(s["N"] for s in live.values()), "live": live,
+                "suspended": suspended, "evictions": self.evictions, "revivals": self.revivals}
+
+    def close(self):
+        with self.lock:
+            live = list(self._live.items())
+            self._live.clear()
+        for sid, w in live:
+            w._lock.acquire()
+            self._evict(sid, w)
@@ -0,0 +1,129 @@
+# TheLight24 v6 – Griglia spaziale uniforme: coppie tra celle adiacenti, distanza minima in O(N)
+import numpy as np
+
+MAX_CELLS = 1 << 20     # celle max per asse (chiave lineare in int64)
+BRUTE_FORCE_MAX = 256   # min_separation: fino a questo N la somma O(N^2) costa meno della griglia
+
+# 13 offset "in avanti" + la cella stessa: ogni coppia di celle adiacenti una volta
+_HALF_OFFSETS = [(0,0,0)] + [(dx,dy,dz)
+                 for dx in (-1,0,1) for dy in (-1,0,1) for dz in (-1,0,1)
+                 if (dx,dy,dz) > (0,0,0)]
+
+class Grid:
+    """
+    Particelle ordinate per cella cubica di lato h.
+    cell_start/cell_count indicizzano l'ordine `order` per ciascuna cella occupata.
+    """
+    def __init__(self, pos, h):
+        span = float(np.max(np.ptp(pos, axis=0))) if pos.shape[0] else 0.0
+        self.h = max(h, span / (MAX_CELLS - 1), 1e-300)
+        self.lo = pos.min(axis=0) if pos.shape[0] else np.zeros(3)
+        ic = np.floor((pos - self.lo) / self.h).astype(np.int64)
+        self.dims = ic.max(axis=0) + 1 if pos.shape[0] else np.ones(3, dtype=np.int64)
+        key = self._key(ic)
+        self.order = np.argsort(key, kind="stable")
+        skey = key[self.order]
+        self.cells, self.cell_start, self.cell_count = np.unique(skey, return_index=True, return_counts=True)
+        self.ic_cells = ic[self.order[self.cell_start]]
+
+    def _key(self, ic):
+        return (ic[:,0]*self.dims[1] + ic[:,1])*self.dims[2] + ic[:,2]
+
+    def occupancy2(self):
+        # ~ numero di coppie che la griglia genera (per scegliere h)
+        return int(np.sum(self.cell_count.astype(np.int64)**2))
+
+    def pairs(self):
+        """Genera (i, j) con i != j in celle adiacenti, ogni coppia non ordinata una volta."""
+        for off in _HALF_OFFSETS:
+            nic = self.ic_cells + np.array(off)
+            ok = np.all((nic >= 0) & (nic < self.dims), axis=1)
+            nkey = self._key(nic[ok])
+            k = np.searchsorted(self.cells, nkey)
+            k = np.minimum(k, self.cells.size - 1)
+            hit = self.cells[k] == nkey
+            a = np.flatnonzero(ok)[hit]     # cella sorgente
+            b = k[hit]                      # cella vicina
+            if a.size == 0:
+                continue
+            # prodotto cartesiano delle particelle delle due celle
+            na, nb = self.cell_count[a], self.cell_count[b]
+            npair = na * nb
+            owner = np.repeat(np.arange(a.size), npair)
+            r = np.arange(int(npair.sum())) - np.repeat(np.cumsum(npair) - npair, npair)
+            ia = self.cell_start[a][owner] + r // nb[owner]
+            ib = self.cell_start[b][owner] + r % nb[owner]
+            if off == (0,0,0):
+                keep = ia < ib
+                ia, ib = ia[keep], ib[keep]
+            yield self.order[ia], self.order[ib]
+
+class VerletList:
+    """
+    Lista di coppie (i,j) entro rc+skin, costruita con celle di lato rc+skin.
+    Resta valida finché nessuna particella si è spostata più di skin/2 dalla costruzione.
+    """
+    def __init__(self, rc, skin):
+        self.rc = rc
+        self.skin = skin
+        self.i = self.j = None
+        self.ref = None         # posizioni alla costruzione
+        self.builds = 0
+
+    def stale(self, pos):
+        if self.ref is None or self.ref.shape != pos.shape:
+            return True
+        d2 = np.einsum('ij,ij->i', pos - self.ref, pos - self.ref)
+        return float(d2.max(initial=0.0)) > (0.5*self.skin)**2
+
+    def build(self, pos):
+        rl2 = (self.rc + self.skin)**2
+        ii, jj = [], []
+        for i, j in Grid(pos, self.rc + self.skin).pairs():
+            dx = pos[j] - pos[i]
+            keep = np.einsum('ij,ij->i', dx, dx) <= rl2
+            ii.append(i[keep]); jj.append(j[keep])
+        self.i = np.concatenate(ii) if ii else np.zeros(0, dtype=np.int64)
+        self.j = np.concatenate(jj) if jj else np.zeros(0, dtype=np.int64)
+        self.ref = pos.copy()
+        self.builds += 1
+
+    def pairs(self, pos):
+        if self.stale(pos):
+            self.build(pos)
+        return self.i, self.j
+
+def min_separation(pos, pair_budget=4):
+    """
+    Distanza minima non nulla tra particelle distinte (inf se non esiste).
+    Fino a BRUTE_FORCE_MAX particelle: tutte le coppie. Oltre, griglia di lato h: se la coppia più vicina trovata tra celle adiacenti ha d <= h
+    è il minimo esatto (le coppie non adiacenti distano più di h); altrimenti h *= 2.
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    N = pos.shape[0]
+    span = float(np.max(np.ptp(pos, axis=0))) if N else 0.0
+    if N < 2 or span == 0.0:
+        return np.inf
+    if N <= BRUTE_FORCE_MAX:
+        dx = pos[None,:,:] - pos[:,None,:]
+        d2 = np.einsum('ijk,ijk->ij', dx, dx)
+        d2 = d2[d2 > 0]
+        return float(np.sqrt(d2.min())) if d2.size else np.inf
+    h = span / N**(1.0/3.0)
+    grid = Grid(pos, h)
+    # cluster densi: rimpicciolisci le celle finché le coppie restano O(N)
+    # (nelle celle piene sum(n_c^2) scala ~ h^3)
+    while grid.occupancy2() > pair_budget * N and grid.h > span / (MAX_CELLS - 1):
+        shrink = max(2.0, (grid.occupancy2() / (pair_budget * N))**(1.0/3.0))
+        grid = Grid(pos, grid.h / shrink)
+    while True:
+        d2min = np.inf
+        for i, j in grid.pairs():
+            dx = pos[j] - pos[i]
+            d2 = np.einsum('ij,ij->i', dx, dx)
+            d2 = d2[d2 > 0]
+            if d2.size:
+                d2min = min(d2min, float(d2.min()))
+        if d2min <= grid.h**2 or grid.h > 2*span:
+            return np.sqrt(d2min)
+        grid = Grid(pos, grid.h * 2)
@@ -0,0 +1,78 @@
+# TheLight24 v6 – Stream posizioni: quantizzazione a 16 bit nel bounding box, keyframe + delta a 8 bit
+import struct
+import numpy as np
+
+MAGIC = b"TL2S"
+KEYFRAME, DELTA = 0, 1
+# magic, tipo, seq, N, frame scartati finora (backpressure), t -> 32 byte
+HEADER = struct.Struct("<4sB3xIII4xd")
+BOX = struct.Struct("<6d")      # solo keyframe: lo[3], span[3]
+Q_MAX = 65535
+
+class StreamEncoder:
+    """
+    Posizioni -> messaggi binari. Keyframe: box (lo, span) e posizioni uint16 in punto fisso
+    (errore <= span/131070 per asse). Delta: differenze int8 rispetto all'ultimo stato quantizzato
+    inviato, quindi il client ricostruisce esattamente le stesse posizioni e l'errore non si accumula.
+    Si torna al keyframe ogni `keyframe_every` messaggi, se N cambia, se una particella esce dal
+    box (allargato di `margin`) o se uno spostamento non sta in int8.
+    """
+    def __init__(self, keyframe_every=50, margin=0.05):
+        self.keyframe_every = keyframe_every
+        self.margin = margin
+        self.seq = 0
+        self._q = None          # stato quantizzato del client (int32)
+        self._lo = self._span = None
+        self._since_key = 0
+
+    def force_keyframe(self):
+        self._q = None
+
+    def _quantize(self, pos):
+        u = (pos - self._lo) / self._span
+        if u.size and (u.min() < 0.0 or u.max() > 1.0):
+            return None
+        return np.rint(u * Q_MAX).astype(np.int32)
+
+    def encode(self, pos, t, dropped=0):
+        pos = np.asarray(pos, dtype=np.float64)
+        N = pos.shape[0]
+        self.seq += 1
+        if self._q is not None and self._q.shape[0] == N and self._since_key < self.keyframe_every:
+            q = self._quantize(pos)
+            if q is not None:
+                d = q - self._q
+                if np.abs(d).max(initial=0) <= 127:
+                    self._q = q
+                    self._since_key += 1
+                    return HEADER.pack(MAGIC, DELTA, self.seq, N, dropped, t) + d.astype(np.int8).tobytes()
+        lo, hi = (pos.min(axis=0), pos.max(axis=0)) if N else (np.zeros(3), np.ones(3))
+        pad = self.margin * (hi - lo)
+        self._lo = lo - pad
+        self._span = np.maximum(hi - lo + 2*pad, 1e-300)
+        self._q = self._quantize(pos)
+        self._since_key = 0
+        return (HEADER.pack(MAGIC, KEYFRAME, self.seq, N, dropped, t)
+                + BOX.pack(*self._lo, *self._span) + self._q.astype("<u2").tobytes())
+
+class StreamDecoder:
+    """Lato client: ricostruisce le posizioni (float64) da keyframe e delta."""
+    def __init__(self):
+        self._q = None
+        self._lo = self._span = None
+
+    def feed(self, data):
+        magic, kind, seq, N, dropped, t = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Messaggio di stream non riconosciuto")
+        off = HEADER.size
+        if kind == KEYFRAME:
+            box = BOX.unpack_from(data, off)
+            self._lo, self._span = np.array(box[:3]), np.array(box[3:])
+            self._q = np.frombuffer(data, dtype="<u2", count=3*N, offset=off + BOX.size).reshape(N, 3).astype(np.int32)
+        else:
+            if self._q is None:
+                raise ValueError("Delta ricevuto prima di un keyframe")
+            self._q = self._q + np.frombuffer(data, dtype=np.int8, count=3*N, offset=off).reshape(N, 3)
+        pos = self._lo + self._q * (self._span / Q_MAX)
+        return {"seq": seq, "keyframe": kind == KEYFRAME, "N": N, "dropped": dropped, "t": t, "pos": pos}
@@ -0,0 +1,75 @@
+# TheLight24 v6 – Traiettorie: frame float32 pos/vel su file .npy memory-mapped preallocato, indice (t, dt)
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+
+def _index_path(path):
+    root, _ = os.path.splitext(path)
+    return root + ".index.npy"
+
+class TrajectoryWriter:
+    """
+    Frame (capacity, 2, N, 3) float32 [pos, vel] in SI, uno ogni `stride` passi.
+    L'indice (capacity, 2) float64 [t, dt] vale NaN per i frame non scritti.
+    A capacità esaurita i frame successivi sono scartati (contati in `dropped`).
+    Se N diminuisce (fusioni) le righe mancanti restano NaN.
+    """
+    def __init__(self, path, N, capacity, stride=1):
+        self.path = path
+        self.N = int(N)
+        self.capacity = int(capacity)
+        self.stride = max(1, int(stride))
+        self.frames = open_memmap(path, mode="w+", dtype=np.float32, shape=(self.capacity, 2, self.N, 3))
+        self.index = open_memmap(_index_path(path), mode="w+", dtype=np.float64, shape=(self.capacity, 2))
+        self.index[:] = np.nan
+        self.count = 0
+        self.dropped = 0
+        self.steps = 0
+
+    def write(self, t, dt, pos, vel):
+        if self.count >= self.capacity:
+            self.dropped += 1
+            return False
+        n = pos.shape[0]
+        f = self.frames[self.count]
+        f[0, :n] = pos
+        f[1, :n] = vel
+        if n < self.N:
+            f[:, n:] = np.nan
+        self.index[self.count] = (t, dt)
+        self.count += 1
+        return True
+
+    def tick(self):
+        # un passo in più: True se va scritto un frame (decimazione)
+        self.steps += 1
+        return self.steps % self.stride == 0
+
+    def close(self):
+        for a in (self.frames, self.index):
+            a.flush()
+        self.frames = self.index = None
+
+class TrajectoryReader:
+    """Accesso a singoli frame senza caricare il file: solo le pagine del frame richiesto vengono lette."""
+    def __init__(self, path):
+        self.path = path
+        self.frames = np.load(path, mmap_mode="r")
+        self.index = np.load(_index_path(path), mmap_mode="r")
+        self.N = self.frames.shape[2]
+
+    def __len__(self):
+        # frame scritti: prefisso dell'indice con t finito
+        written = np.isfinite(self.index[:, 0])
+        return int(written.size if written.all() else np.argmin(written))
+
+    def frame(self, k, max_particles=None):
+        if not 0 <= k < len(self):
+            raise IndexError(f"frame {k} fuori intervallo (0..{len(self) - 1})")
+        n = self.N if max_particles is None else min(self.N, max_particles)
+        pos = np.array(self.frames[k, 0, :n])
+        vel = np.array(self.frames[k, 1, :n])
+        alive = ~np.isnan(pos[:, 0])
+        t, dt = self.index[k]
+        return {"frame": k, "t": float(t), "dt": float(dt), "N": int(alive.sum()),
+                "pos": pos[alive], "vel": vel[alive]}
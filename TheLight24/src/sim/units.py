@@ -1,6 +1,62 @@
 # TheLight24 v6 – Units helpers
+import copy, math
+import numpy as np
+
 G_SI = 6.67430e-11           # m^3 kg^-1 s^-2
 EPS0_SI = 8.8541878128e-12   # F/m
+K_SI = 1.0/(4.0*math.pi*EPS0_SI)  # N m^2 C^-2
 
 def clamp(v, vmin, vmax):
     return max(vmin, min(v, vmax))
+
+class UnitSystem:
+    """
+    Unità interne adimensionali (lunghezza L, massa M, carica Q, tempo T in SI).
+    Scelte in modo che posizioni, masse e accoppiamenti siano O(1): così i kernel
+    possono girare in float32 senza overflow di r2**-1.5.
+    """
+    def __init__(self, L=1.0, M=1.0, Q=1.0, T=1.0):
+        self.L, self.M, self.Q, self.T = float(L), float(M), float(Q), float(T)
+        self.G = G_SI * self.M * self.T**2 / self.L**3
+        self.K = K_SI * self.Q**2 * self.T**2 / (self.M * self.L**3)
+
+    @classmethod
+    def for_state(cls, pos, vel, mass, charge, cfg):
+        L = float(np.max(np.ptp(pos, axis=0))) if len(pos) else 0.0
+        L = max(L, cfg.softening) or 1.0
+        M = float(np.sum(np.abs(mass))) or 1.0
+        Q = float(np.max(np.abs(charge), initial=0.0)) or 1.0
+        # accelerazione tipica degli accoppiamenti attivi -> T = sqrt(L/a0)
+        a0 = ((G_SI*M if cfg.grav else 0.0)
+              + (K_SI*Q*Q/M if cfg.coulomb else 0.0)
+              + (cfg.yukawa_alpha/M if cfg.yukawa else 0.0)) / L**2
+        if a0 > 0:
+            T = math.sqrt(L / a0)
+        else:
+            vmax = float(np.max(np.abs(vel), initial=0.0))
+            T = L / vmax if vmax > 0 else 1.0
+        return cls(L, M, Q, T)
+
+    # SI -> interne
+    def to_internal(self, pos, vel, mass, charge):
+        return pos / self.L, vel * (self.T / self.L), mass / self.M, charge / self.Q
+
+    # interne -> SI
+    def pos_si(self, x):    return x * self.L
+    def vel_si(self, v):    return v * (self.L / self.T)
+    def mass_si(self, m):   return m * self.M
+    def charge_si(self, q): return q * self.Q
+    def energy_si(self, e): return e * (self.M * self.L**2 / self.T**2)
+
+    def scale_config(self, cfg):
+        # copia di PhysicsConfig con i parametri dimensionali in unità interne
+        c = copy.copy(cfg)
+        F0 = self.M * self.L / self.T**2
+        c.softening = cfg.softening / self.L
+        c.yukawa_lambda = cfg.yukawa_lambda / self.L
+        c.yukawa_alpha = cfg.yukawa_alpha / (F0 * self.L**2)
+        c.drag_gamma = cfg.drag_gamma * self.T / self.M
+        c.block_dt = cfg.block_dt / self.T
+        c.box_size = cfg.box_size / self.L
+        c.collision_radius = cfg.collision_radius * np.cbrt(self.M) / self.L
+        return c
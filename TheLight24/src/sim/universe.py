@@ -1,57 +1,218 @@
 # TheLight24 v6 – Universe orchestrator
 import json, os
+from time import perf_counter
 import numpy as np
 from .physics_core import PhysicsCore, PhysicsConfig
+from .units import UnitSystem
+from .diagnostics import Diagnostics
+from .trajectory import TrajectoryWriter
+from .loader import read_scenario
+from .profiling import Profiler, profiled
+
+def frame_to_json(frame, max_particles=None, fields=("pos", "vel", "mass")):
+    # frame di Universe.frame -> dict serializzabile (liste), eventualmente troncato
+    if not frame: return {}
+    N = frame["N"] if max_particles is None else min(frame["N"], max_particles)
+    return {"t": frame["t"], "dt": frame["dt"], "N": N,
+            **{k: frame[k][:N].tolist() for k in fields}}
+
+class StepStats:
+    """Statistiche aggregate di una serie di passi (dt in secondi SI, tempo di calcolo reale)."""
+    def __init__(self):
+        self.steps = 0
+        self.dt_min = float("inf")
+        self.dt_max = 0.0
+        self.dt_sum = 0.0
+        self.dt_last = None
+        self.wall = 0.0
+
+    def add(self, dt):
+        self.steps += 1
+        self.dt_min = min(self.dt_min, dt)
+        self.dt_max = max(self.dt_max, dt)
+        self.dt_sum += dt
+        self.dt_last = dt
+
+    def as_dict(self):
+        n = self.steps
+        return {"steps": n,
+                "dt_min": float(self.dt_min) if n else None,
+                "dt_max": float(self.dt_max) if n else None,
+                "dt_mean": float(self.dt_sum / n) if n else None,
+                "dt_last": None if self.dt_last is None else float(self.dt_last),
+                "wall_s": self.wall,
+                "steps_per_s": n / self.wall if self.wall > 0 else None}
 
 class Universe:
     """
     Carica scenari, gestisce stato, integra e fornisce snapshot per la GUI.
     """
-    def __init__(self):
+    def __init__(self, backend="numpy"):
+        self.backend = backend  # "numpy" (PhysicsCore) | "native" (Simulator C++, src/simulator)
         self.core = None
         self.cfg  = PhysicsConfig()
+        self.units = None   # UnitSystem se precision="mixed" (core in unità interne)
         self.t    = 0.0
         self.dt_last = 0.01
+        self.diag = Diagnostics()
+        self.recorder = None    # TrajectoryWriter attivo
+        self.prof = Profiler()  # condiviso col core; attivabile a runtime (prof.enabled)
 
-    def load_from_json(self, path):
-        with open(path, encoding="utf-8") as f:
-            data = json.load(f)
-
-        pos = np.array(data["pos"], dtype=np.float64)   # [[x,y,z],...]
-        vel = np.array(data["vel"], dtype=np.float64)
-        mass = np.array(data["mass"], dtype=np.float64)
-        charge = np.array(data.get("charge",[0.0]*len(mass)), dtype=np.float64)
-
-        pc = data.get("physics", {})
-        self.cfg = PhysicsConfig(
-            grav=pc.get("grav", True),
-            coulomb=pc.get("coulomb", False),
-            yukawa=pc.get("yukawa", False),
-            yukawa_lambda=pc.get("yukawa_lambda", 1e9),
-            yukawa_alpha=pc.get("yukawa_alpha", 0.1),
-            drag=pc.get("drag", False),
-            drag_gamma=pc.get("drag_gamma", 0.0),
-            softening=pc.get("softening", 1e3),
-        )
-        self.core = PhysicsCore(pos, vel, mass, charge, self.cfg)
+    def load(self, path):
+        """
+        Scenario .json (liste pos/vel/mass oppure "generator": {"type": ..., ...}),
+        .npy (N,7|8) [x y z vx vy vz m (q)] o .npz (pos, vel, mass, charge, physics).
+        """
+        state, physics = read_scenario(path)
+        pos, vel, mass, charge = state["pos"], state["vel"], state["mass"], state["charge"]
+
+        self.cfg = PhysicsConfig.from_dict(physics)
+        self.diag = Diagnostics(self.cfg.diag_every)
+        self.units = None
+        if self.backend != "native" and self.cfg.precision == "mixed":
+            self.units = UnitSystem.for_state(pos, vel, mass, charge, self.cfg)
+            pos, vel, mass, charge = self.units.to_internal(pos, vel, mass, charge)
+        self._start(pos, vel, mass, charge)
         self.t = 0.0
         self.dt_last = 0.01
 
+    def load_from_json(self, path):
+        self.load(path)
+
+    def _start(self, pos, vel, mass, charge):
+        # nuovo core su uno stato già in unità interne (se self.units) con self.cfg in SI
+        if self.core is not None:
+            self.core.close()
+        self.stop_recording()
+        if self.backend == "native":
+            from .native import NativeCore
+            self.core = NativeCore(pos, vel, mass, charge, self.cfg)
+        else:
+            core_cfg = self.cfg if self.units is None else self.units.scale_config(self.cfg)
+            self.core = PhysicsCore(pos, vel, mass, charge, core_cfg, units=self.units)
+        self.core.prof = self.prof
+
+    def save_checkpoint(self, path):
+        """
+        Stato completo in un .npz non compresso: array del core così come sono
+        (unità interne se mixed, con L/M/Q/T), PhysicsConfig, clock e backend.
+        """
+        if self.core is None:
+            raise RuntimeError("Nessuno scenario caricato")
+        c = self.core
+        arrays = dict(pos=c.pos, vel=c.vel, mass=c.mass, charge=c.charge)
+        if getattr(c, "_block_n", None) is not None:
+            arrays["block_n"] = c._block_n
+        u = self.units
+        meta = {
+            "cfg": vars(self.cfg),
+            "backend": self.backend,
+            "t": self.t,
+            "dt_last": self.dt_last,
+            "units": None if u is None else [u.L, u.M, u.Q, u.T],
+            "diag": [self.diag.steps, self.diag.E0],
+        }
+        # file già aperto: np.savez non aggiunge l'estensione
+        with open(path, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+
+    def load_checkpoint(self, path):
+        with np.load(path) as z:
+            meta = json.loads(str(z["meta"]))
+            arrays = {k: z[k] for k in z.files if k != "meta"}
+        self.cfg = PhysicsConfig.from_dict(meta["cfg"])
+        self.backend = meta["backend"]
+        self.units = None if meta["units"] is None else UnitSystem(*meta["units"])
+        self._start(arrays["pos"], arrays["vel"], arrays["mass"], arrays["charge"])
+        if "block_n" in arrays:
+            self.core._block_n = arrays["block_n"]
+        self.t = meta["t"]
+        self.dt_last = meta["dt_last"]
+        self.diag = Diagnostics(self.cfg.diag_every)
+        self.diag.steps, self.diag.E0 = meta["diag"]
+
+    @profiled("universe.step")
     def step(self, dt=None):
         if self.core is None: return 0.0
-        dt_used = self.core.step(dt)
+        self.diag.before_step(self.core, self.t)
+        if self.units is None:
+            dt_used = self.core.step(dt)
+        else:
+            dt_used = self.core.step(None if dt is None else dt / self.units.T) * self.units.T
         self.t += dt_used
         self.dt_last = dt_used
+        with self.prof.phase("diagnostics"):
+            self.diag.after_step(self.core, self.t, self.units)
+        if self.recorder is not None and self.recorder.tick():
+            with self.prof.phase("record"):
+                self.recorder.write(self.t, dt_used, *self._state_si())
         return dt_used
 
-    def snapshot(self, max_particles=None):
+    def advance(self, steps=None, until_t=None, dt=None, stats=None):
+        """
+        Fino a `steps` passi e/o fino a t = until_t (l'ultimo passo è accorciato per arrivarci
+        esattamente); senza limiti un solo passo. Ritorna `stats` (StepStats) aggiornate.
+        """
+        stats = StepStats() if stats is None else stats
+        if self.core is None: return stats
+        if steps is None and until_t is None:
+            steps = 1
+        t0 = perf_counter()
+        k = 0
+        while (steps is None or k < steps) and (until_t is None or self.t < until_t):
+            h = dt
+            if until_t is not None:
+                rem = until_t - self.t
+                h = min(self._next_dt() if h is None else h, rem)
+            used = self.step(h)
+            if until_t is not None and h >= rem:
+                self.t = until_t        # niente residui di arrotondamento
+            stats.add(used)
+            k += 1
+        stats.wall += perf_counter() - t0
+        return stats
+
+    def _next_dt(self):
+        # dt (SI) che il core sceglierebbe da sé al prossimo passo
+        if self.cfg.integrator == "block" and self.backend != "native":
+            return self.cfg.block_dt
+        return self.core.suggest_dt() * (self.units.T if self.units else 1.0)
+
+    def _state_si(self):
+        pos, vel = self.core.pos, self.core.vel
+        if self.units is not None:
+            pos, vel = self.units.pos_si(pos), self.units.vel_si(vel)
+        return pos, vel
+
+    def record(self, path, capacity, stride=1):
+        """Registra la traiettoria su file memory-mapped: frame iniziale + uno ogni `stride` passi."""
+        if self.core is None:
+            raise RuntimeError("Nessuno scenario caricato")
+        self.stop_recording()
+        self.recorder = TrajectoryWriter(path, self.core.N, capacity, stride)
+        self.recorder.write(self.t, self.dt_last, *self._state_si())
+        return self.recorder
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def diagnostics(self):
+        # ultimo campione (None se spente o non ancora campionate)
+        return self.diag.latest()
+
+    def frame(self, max_particles=None):
+        """Copie SI di pos/vel/mass e clock: indipendenti dal core (lo stato può avanzare)."""
         if self.core is None: return {}
         N = self.core.N if max_particles is None else min(self.core.N, max_particles)
-        return {
-            "t": self.t,
-            "dt": self.dt_last,
-            "N": N,
-            "pos": self.core.pos[:N].tolist(),
-            "vel": self.core.vel[:N].tolist(),
-            "mass": self.core.mass[:N].tolist(),
-        }
+        pos, vel, mass = self.core.pos[:N], self.core.vel[:N], self.core.mass[:N]
+        if self.units is not None:
+            pos, vel, mass = self.units.pos_si(pos), self.units.vel_si(vel), self.units.mass_si(mass)
+        else:
+            pos, vel, mass = pos.copy(), vel.copy(), mass.copy()
+        return {"t": self.t, "dt": self.dt_last, "N": N, "pos": pos, "vel": vel, "mass": mass}
+
+    @profiled("universe.snapshot")
+    def snapshot(self, max_particles=None):
+        return frame_to_json(self.frame(max_particles))
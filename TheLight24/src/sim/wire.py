@@ -0,0 +1,60 @@
+# TheLight24 v6 – Snapshot binario: header fisso + array little-endian contigui (application/octet-stream)
+import struct
+import numpy as np
+
+MEDIA_TYPE = "application/octet-stream"
+MAGIC = b"TL24"
+VERSION = 1
+# magic, versione, byte per valore (4|8), maschera campi, N, t, dt, padding -> 32 byte (array allineati a 8)
+HEADER = struct.Struct("<4sBBHIdd4x")
+FIELDS = {"pos": (1, 3), "vel": (2, 3), "mass": (4, 1)}     # nome -> (bit, componenti), nell'ordine del corpo
+DTYPES = {"float32": "<f4", "float64": "<f8"}
+
+def parse_fields(spec):
+    """"pos,vel" -> ["pos", "vel"] nell'ordine canonico; None = tutti."""
+    if not spec:
+        return list(FIELDS)
+    names = {s.strip() for s in spec.split(",") if s.strip()}
+    unknown = names - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Campi sconosciuti: {', '.join(sorted(unknown))} (disponibili: {', '.join(FIELDS)})")
+    return [k for k in FIELDS if k in names]
+
+def encode(frame, fields=None, dtype="float32", max_particles=None):
+    """
+    Frame di Universe.frame -> bytes: HEADER poi, per ogni campo scelto, l'array (N,3) o (N,)
+    in row-major. Un solo buffer preallocato: gli array vi sono convertiti direttamente.
+    """
+    fields = list(FIELDS) if fields is None else fields
+    dt_code = np.dtype(DTYPES[dtype])
+    if not frame:
+        return HEADER.pack(MAGIC, VERSION, dt_code.itemsize, 0, 0, 0.0, 0.0)
+    N = frame["N"] if max_particles is None else min(frame["N"], max_particles)
+    mask = 0
+    for k in fields:
+        mask |= FIELDS[k][0]
+    size = HEADER.size + sum(N * FIELDS[k][1] for k in fields) * dt_code.itemsize
+    buf = bytearray(size)
+    HEADER.pack_into(buf, 0, MAGIC, VERSION, dt_code.itemsize, mask, N, frame["t"], frame["dt"])
+    off = HEADER.size
+    for k in fields:
+        n = N * FIELDS[k][1]
+        out = np.frombuffer(buf, dtype=dt_code, count=n, offset=off)
+        np.copyto(out.reshape(frame[k][:N].shape), frame[k][:N], casting="same_kind")
+        off += n * dt_code.itemsize
+    return bytes(buf)
+
+def decode(data):
+    """bytes -> dict t, dt, N e un array (vista in sola lettura sul buffer) per campo presente."""
+    magic, version, itemsize, mask, N, t, dt = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Snapshot binario non riconosciuto")
+    dt_code = np.dtype("<f4" if itemsize == 4 else "<f8")
+    out = {"t": t, "dt": dt, "N": N}
+    off = HEADER.size
+    for k, (bit, comps) in FIELDS.items():
+        if mask & bit:
+            a = np.frombuffer(data, dtype=dt_code, count=N * comps, offset=off)
+            out[k] = a.reshape(N, 3) if comps == 3 else a
+            off += a.nbytes
+    return out
@@ -3,17 +3,18 @@
 #include <cmath>
 #include <sstream>
 
+// Descrittore di un corpo da aggiungere al Simulator (lo stato vive negli array SoA del Simulator)
 struct Entity {
     std::string name;
-    double x, y;
-    double vx, vy;
+    double x, y, z;
+    double vx, vy, vz;
     double mass;
     double charge;
     double spin;
     double radius;
 
-    Entity(std::string n, double px, double py, double m, double q=0.0, double s=0.0)
-        : name(std::move(n)), x(px), y(py), vx(0.0), vy(0.0),
+    Entity(std::string n, double px, double py, double m, double q=0.0, double s=0.0, double pz=0.0)
+        : name(std::move(n)), x(px), y(py), z(pz), vx(0.0), vy(0.0), vz(0.0),
           mass(m), charge(q), spin(s), radius(std::cbrt(m)*0.1) {}
 
     std::string repr() const {
@@ -1,6 +1,5 @@
 #pragma once
 #include <cmath>
-#include "entity.hpp"
 
 namespace Physics {
 
@@ -8,51 +7,35 @@ namespace Physics {
     constexpr double K = 8.9875517923e9; // coulomb
     constexpr double HBAR = 1.054571817e-34;
 
-    // Calcolo forza gravitazionale tra due corpi
-    inline void gravity(Entity &a, Entity &b, double &fx, double &fy) {
-        double dx = b.x - a.x;
-        double dy = b.y - a.y;
-        double r2 = dx*dx + dy*dy + 1e-9;
-        double f = G * a.mass * b.mass / r2;
-        double invr = 1.0 / std::sqrt(r2);
-        fx += f * dx * invr;
-        fy += f * dy * invr;
+    // Ogni legge restituisce il coefficiente c della forza su a: F_a = c * (x_b - x_a).
+    // r2 = |x_b - x_a|^2 + softening^2, r = sqrt(r2): calcolati una volta per coppia.
+
+    // Forza gravitazionale tra due corpi
+    inline double gravity(double ma, double mb, double r2, double r) {
+        return G * ma * mb / (r2 * r);
     }
 
     // Forza di Coulomb
-    inline void coulomb(Entity &a, Entity &b, double &fx, double &fy) {
-        double dx = b.x - a.x;
-        double dy = b.y - a.y;
-        double r2 = dx*dx + dy*dy + 1e-9;
-        double f = K * a.charge * b.charge / r2;
-        double invr = 1.0 / std::sqrt(r2);
-        fx += f * dx * invr;
-        fy += f * dy * invr;
+    inline double coulomb(double qa, double qb, double r2, double r) {
+        return K * qa * qb / (r2 * r);
     }
 
     // Forza di Yukawa (campo mediato)
-    inline void yukawa(Entity &a, Entity &b, double &fx, double &fy, double alpha=1e-10, double mu=1e-4) {
-        double dx = b.x - a.x;
-        double dy = b.y - a.y;
-        double r = std::sqrt(dx*dx + dy*dy) + 1e-9;
-        double f = alpha * std::exp(-mu*r) / (r*r);
-        fx += f * dx / r;
-        fy += f * dy / r;
+    inline double yukawa(double r2, double r, double alpha=1e-10, double mu=1e-4) {
+        return alpha * std::exp(-mu*r) / (r2 * r);
     }
 
     // Forza Casimir semplificata (interazione quantica a corto raggio)
-    inline void casimir(Entity &a, Entity &b, double &fx, double &fy) {
-        double dx = b.x - a.x;
-        double dy = b.y - a.y;
-        double r = std::sqrt(dx*dx + dy*dy) + 1e-9;
-        double f = -HBAR * 3.14159 / (240.0 * std::pow(r, 4));
-        fx += f * dx / r;
-        fy += f * dy / r;
+    inline double casimir(double r2, double r) {
+        return -HBAR * 3.14159 / (240.0 * r2 * r2 * r);
     }
 
-    // Attrito viscoso (simulazione fluido)
-    inline void drag(Entity &a, double coeff=1e-5) {
-        a.vx -= coeff * a.vx;
-        a.vy -= coeff * a.vy;
+    // Attrito viscoso (simulazione fluido): frazione fissa per passo + drag lineare esatto gamma/m
+    inline void drag(double *v, double mass, double dt, double coeff=1e-5, double gamma=0.0) {
+        double f = 1.0 - coeff;
+        if (gamma != 0.0) f *= std::exp(-gamma * dt / mass);
+        v[0] *= f;
+        v[1] *= f;
+        v[2] *= f;
     }
 }
@@ -1,18 +1,52 @@
 #include "simulator.hpp"
 #include <iostream>
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <pybind11/stl.h>
 namespace py = pybind11;
 
+// Mutex del Simulator preso senza GIL: chi lo detiene (step/add/resize) non deve
+// attendere l'interprete, e gli altri thread Python continuano a girare nel frattempo.
+static std::unique_lock<std::mutex> hold(Simulator &s) {
+    std::unique_lock<std::mutex> guard(s.lock, std::defer_lock);
+    py::gil_scoped_release nogil;
+    guard.lock();
+    return guard;
+}
+
+// Vista NumPy (buffer protocol, nessuna copia) su un vettore del Simulator.
+// La base è una capsule che tiene vivo il Simulator e conta la vista in `exports`
+// finché NumPy (o una vista derivata) la usa: nel frattempo add/resize sono rifiutati.
+// Presa sotto il mutex: add/resize non possono riallocare mentre si legge data()/size().
+static py::array view(py::object self, std::vector<double> &v, py::ssize_t cols) {
+    Simulator &s = self.cast<Simulator&>();
+    auto guard = hold(s);
+    ++s.exports;
+    py::capsule base(new py::object(self), [](void *p) {
+        auto *owner = static_cast<py::object*>(p);
+        --owner->cast<Simulator&>().exports;
+        delete owner;
+    });
+    const py::ssize_t n = static_cast<py::ssize_t>(v.size()) / cols;
+    const py::ssize_t item = sizeof(double);
+    if (cols == 1)
+        return py::array_t<double>({n}, {item}, v.data(), base);
+    return py::array_t<double>({n, cols}, {cols*item, item}, v.data(), base);
+}
+
 PYBIND11_MODULE(physics_core, m) {
+    py::register_exception<BufferInUse>(m, "BufferInUse", PyExc_BufferError);
+
     py::class_<Entity>(m, "Entity")
-        .def(py::init<std::string,double,double,double,double,double>(),
+        .def(py::init<std::string,double,double,double,double,double,double>(),
              py::arg("name"), py::arg("x"), py::arg("y"), py::arg("mass"),
-             py::arg("charge")=0.0, py::arg("spin")=0.0)
+             py::arg("charge")=0.0, py::arg("spin")=0.0, py::arg("z")=0.0)
         .def_readwrite("x", &Entity::x)
         .def_readwrite("y", &Entity::y)
+        .def_readwrite("z", &Entity::z)
         .def_readwrite("vx", &Entity::vx)
         .def_readwrite("vy", &Entity::vy)
+        .def_readwrite("vz", &Entity::vz)
         .def_readwrite("mass", &Entity::mass)
         .def_readwrite("charge", &Entity::charge)
         .def_readwrite("spin", &Entity::spin)
@@ -20,9 +54,32 @@ PYBIND11_MODULE(physics_core, m) {
 
     py::class_<Simulator>(m, "Simulator")
         .def(py::init<>())
-        .def("add", &Simulator::add)
-        .def("step", &Simulator::step)
-        .def("snapshot", &Simulator::snapshot)
+        // add/resize attendono lo step in corso (stesso mutex) senza bloccare l'interprete
+        .def("add", &Simulator::add, py::call_guard<py::gil_scoped_release>())
+        .def("resize", &Simulator::resize, py::call_guard<py::gil_scoped_release>())
+        // il GIL è rilasciato durante l'integrazione: l'API continua a servire richieste
+        .def("step", &Simulator::step, py::arg("steps")=1, py::call_guard<py::gil_scoped_release>())
+        .def("snapshot", &Simulator::snapshot, py::call_guard<py::gil_scoped_release>())
+        .def("__len__", [](Simulator &s) { auto guard = hold(s); return s.size(); })
+        // viste (N,3)/(N,) scrivibili; finché ne esiste una, add/resize sollevano BufferInUse (BufferError)
+        .def_property_readonly("pos", [](py::object self) { return view(self, self.cast<Simulator&>().pos, 3); })
+        .def_property_readonly("vel", [](py::object self) { return view(self, self.cast<Simulator&>().vel, 3); })
+        .def_property_readonly("acc", [](py::object self) { return view(self, self.cast<Simulator&>().acc, 3); })
+        .def_property_readonly("mass", [](py::object self) { return view(self, self.cast<Simulator&>().mass, 1); })
+        .def_property_readonly("charge", [](py::object self) { return view(self, self.cast<Simulator&>().charge, 1); })
+        .def_property_readonly("names", [](Simulator &s) { auto guard = hold(s); return s.names; })
         .def_readwrite("dt", &Simulator::dt)
-        .def_readwrite("area", &Simulator::area);
+        .def_readwrite("t", &Simulator::t)
+        .def_readwrite("area", &Simulator::area)
+        .def_readwrite("grav", &Simulator::grav)
+        .def_readwrite("coulomb", &Simulator::coulomb)
+        .def_readwrite("yukawa", &Simulator::yukawa)
+        .def_readwrite("casimir", &Simulator::casimir)
+        .def_readwrite("walls", &Simulator::walls)
+        .def_readwrite("softening2", &Simulator::softening2)
+        .def_readwrite("yukawa_alpha", &Simulator::yukawa_alpha)
+        .def_readwrite("yukawa_mu", &Simulator::yukawa_mu)
+        .def_readwrite("drag", &Simulator::drag)
+        .def_readwrite("drag_gamma", &Simulator::drag_gamma)
+        .def_readwrite("threads", &Simulator::threads);
 }
@@ -1,51 +1,175 @@
 #pragma once
 #include <vector>
-#include <random>
+#include <string>
+#include <sstream>
+#include <mutex>
+#include <atomic>
+#include <stdexcept>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
 #include "entity.hpp"
 #include "physics.hpp"
 
+// add/resize con viste NumPy ancora vive: riallocando resterebbero su memoria liberata
+struct BufferInUse : std::runtime_error {
+    using std::runtime_error::runtime_error;
+};
+
+// Stato 3D structure-of-arrays: un vettore contiguo per campo
+// (pos/vel/acc N*3 con xyz consecutivi, mass/charge/spin/radius N),
+// esposto a Python come viste NumPy senza copie.
 class Simulator {
 public:
-    std::vector<Entity> entities;
+    std::vector<std::string> names;
+    std::vector<double> pos, vel, acc;
+    std::vector<double> mass, charge, spin, radius;
+    std::vector<double> force;  // accumulatori per thread, T*N*3
     double dt = 1.0;
     double t = 0.0;
     double area = 10000.0;
 
+    // leggi attive e parametri (i default riproducono il modello storico)
+    bool grav = true, coulomb = true, yukawa = true, casimir = true, walls = true;
+    double softening2 = 1e-9;
+    double yukawa_alpha = 1e-10, yukawa_mu = 1e-4;
+    double drag = 1e-5, drag_gamma = 0.0;
+    int threads = 0;            // thread OpenMP per il calcolo delle forze (0 = default OpenMP)
+
+    // step() gira senza GIL: il lock serializza step/snapshot/add/resize e la lettura di
+    // viste, len e names (binding in simulator.cpp) chiamati da thread Python diversi
+    std::mutex lock;
+    // viste NumPy esportate e non ancora rilasciate (come bytearray: niente riallocazioni)
+    std::atomic<int> exports{0};
+
     Simulator() = default;
 
-    void add(const Entity &e) { entities.push_back(e); }
+    size_t size() const { return mass.size(); }
+
+    // add/resize riallocano: rifiutati finché esiste una vista sui vettori
+    void check_exports() const {
+        if (exports > 0)
+            throw BufferInUse("viste NumPy (pos/vel/acc/mass/charge) ancora in uso: rilasciale prima di add/resize");
+    }
+
+    void add(const Entity &e) {
+        std::lock_guard<std::mutex> guard(lock);
+        check_exports();
+        names.push_back(e.name);
+        pos.insert(pos.end(), {e.x, e.y, e.z});
+        vel.insert(vel.end(), {e.vx, e.vy, e.vz});
+        acc.insert(acc.end(), {0.0, 0.0, 0.0});
+        mass.push_back(e.mass);
+        charge.push_back(e.charge);
+        spin.push_back(e.spin);
+        radius.push_back(e.radius);
+    }
+
+    void resize(size_t n) {
+        std::lock_guard<std::mutex> guard(lock);
+        check_exports();
+        for (size_t i = names.size(); i < n; ++i) names.push_back("p" + std::to_string(i));
+        names.resize(n);
+        pos.resize(3*n, 0.0);
+        vel.resize(3*n, 0.0);
+        acc.resize(3*n, 0.0);
+        mass.resize(n, 1.0);
+        charge.resize(n, 0.0);
+        spin.resize(n, 0.0);
+        radius.resize(n, 0.1);
+    }
 
+    // acc = F/m su tutte le particelle, con le posizioni correnti.
+    // Ogni coppia i<j una volta (+F su i, -F su j): il ciclo esterno su i è diviso tra i thread,
+    // ciascuno accumula in un proprio buffer N*3, poi i buffer si sommano per particella.
+    void accelerations() {
+        const long N = static_cast<long>(size());
+        int T = 1;
+#ifdef _OPENMP
+        T = threads > 0 ? threads : omp_get_max_threads();
+#endif
+        force.assign(static_cast<size_t>(T) * 3 * N, 0.0);
+        #pragma omp parallel num_threads(T)
+        {
+            int tid = 0;
+#ifdef _OPENMP
+            tid = omp_get_thread_num();
+#endif
+            double *F = force.data() + static_cast<size_t>(tid) * 3 * N;
+            // righe corte verso la fine del triangolo: schedule dinamico
+            #pragma omp for schedule(dynamic, 16)
+            for (long i = 0; i < N; ++i) {
+                double fx = 0.0, fy = 0.0, fz = 0.0;
+                for (long j = i + 1; j < N; ++j) {
+                    double dx = pos[3*j] - pos[3*i];
+                    double dy = pos[3*j+1] - pos[3*i+1];
+                    double dz = pos[3*j+2] - pos[3*i+2];
+                    double r2 = dx*dx + dy*dy + dz*dz + softening2;
+                    double r = std::sqrt(r2);
+                    double c = 0.0;
+                    if (grav) c += Physics::gravity(mass[i], mass[j], r2, r);
+                    if (coulomb) c += Physics::coulomb(charge[i], charge[j], r2, r);
+                    if (yukawa) c += Physics::yukawa(r2, r, yukawa_alpha, yukawa_mu);
+                    if (casimir) c += Physics::casimir(r2, r);
+                    fx += c * dx;
+                    fy += c * dy;
+                    fz += c * dz;
+                    F[3*j] -= c * dx;
+                    F[3*j+1] -= c * dy;
+                    F[3*j+2] -= c * dz;
+                }
+                F[3*i] += fx;
+                F[3*i+1] += fy;
+                F[3*i+2] += fz;
+            }
+            // riduzione dei buffer per thread (barriera implicita dopo il for)
+            #pragma omp for schedule(static)
+            for (long i = 0; i < N; ++i) {
+                double f[3] = {0.0, 0.0, 0.0};
+                for (int k = 0; k < T; ++k) {
+                    const double *Fk = force.data() + static_cast<size_t>(k) * 3 * N;
+                    f[0] += Fk[3*i];
+                    f[1] += Fk[3*i+1];
+                    f[2] += Fk[3*i+2];
+                }
+                acc[3*i] = f[0] / mass[i];
+                acc[3*i+1] = f[1] / mass[i];
+                acc[3*i+2] = f[2] / mass[i];
+            }
+        }
+    }
+
+    // Eulero semi-implicito: forze da tutte le posizioni all'inizio del passo
     void step(unsigned int steps=1) {
+        std::lock_guard<std::mutex> guard(lock);
+        const size_t N = size();
         for (unsigned int s=0; s<steps; ++s) {
-            for (auto &a : entities) {
-                double fx = 0.0, fy = 0.0;
-                for (auto &b : entities) {
-                    if (&a == &b) continue;
-                    Physics::gravity(a,b,fx,fy);
-                    Physics::coulomb(a,b,fx,fy);
-                    Physics::yukawa(a,b,fx,fy);
-                    Physics::casimir(a,b,fx,fy);
+            accelerations();
+            for (size_t i = 0; i < N; ++i) {
+                double *v = &vel[3*i];
+                double *x = &pos[3*i];
+                for (int k = 0; k < 3; ++k) {
+                    v[k] += acc[3*i+k] * dt;
+                    x[k] += v[k] * dt;
                 }
-                // aggiornamento velocità/posizione
-                a.vx += (fx/a.mass)*dt;
-                a.vy += (fy/a.mass)*dt;
-                a.x += a.vx * dt;
-                a.y += a.vy * dt;
-                Physics::drag(a);
+                Physics::drag(v, mass[i], dt, drag, drag_gamma);
                 // confini
-                if (a.x < 0 || a.x > area) a.vx *= -0.9;
-                if (a.y < 0 || a.y > area) a.vy *= -0.9;
+                if (walls) {
+                    for (int k = 0; k < 3; ++k)
+                        if (x[k] < 0 || x[k] > area) v[k] *= -0.9;
+                }
             }
             t += dt;
         }
     }
 
-    std::string snapshot() const {
+    std::string snapshot() {
+        std::lock_guard<std::mutex> guard(lock);
         std::ostringstream ss;
-        ss << "t=" << t << "  Entities=" << entities.size() << "\n";
-        for (auto &e : entities) {
-            ss << "  " << e.name << "  x=" << e.x << " y=" << e.y
-               << " vx=" << e.vx << " vy=" << e.vy << "\n";
+        ss << "t=" << t << "  Entities=" << size() << "\n";
+        for (size_t i = 0; i < size(); ++i) {
+            ss << "  " << names[i] << "  x=" << pos[3*i] << " y=" << pos[3*i+1] << " z=" << pos[3*i+2]
+               << " vx=" << vel[3*i] << " vy=" << vel[3*i+1] << " vz=" << vel[3*i+2] << "\n";
         }
         return ss.str();
     }
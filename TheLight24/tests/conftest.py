@@ -4,6 +4,8 @@ import pytest
 def pytest_addoption(parser):
     parser.addoption("--with-audio", action="store_true", default=False, help="Esegui test audio live")
     parser.addoption("--with-video", action="store_true", default=False, help="Esegui test video live")
+    parser.addoption("--with-bench", action="store_true", default=False, help="Esegui il benchmark fisica")
+    parser.addoption("--bench-threshold", type=float, default=0.25, help="Regressione tollerata vs baseline")
 
 @pytest.fixture(scope="session")
 def audio_enabled(pytestconfig):
@@ -13,6 +15,10 @@ def audio_enabled(pytestconfig):
 def video_enabled(pytestconfig):
     return pytestconfig.getoption("--with-video")
 
+@pytest.fixture(scope="session")
+def bench_enabled(pytestconfig):
+    return pytestconfig.getoption("--with-bench")
+
 @pytest.fixture(scope="session")
 def have_build():
     # verifica che il modulo C++ sia visibile
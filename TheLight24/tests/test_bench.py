@@ -0,0 +1,23 @@
+import json, os
+import pytest
+from src.sim import bench
+
+def test_physics_benchmark(bench_enabled, pytestconfig):
+    if not bench_enabled:
+        pytest.skip("Avvia con --with-bench per il benchmark fisica")
+    report = bench.run(sizes=(100, 1000), min_time=0.3)
+    assert report["results"] and all(r["steps_per_s"] > 0 for r in report["results"])
+    # prima esecuzione sulla macchina: i risultati diventano la baseline
+    if not os.path.exists(bench.BASELINE_PATH):
+        bench.save_json(bench.BASELINE_PATH, report)
+    with open(bench.BASELINE_PATH, encoding="utf-8") as f:
+        report["regressions"] = bench.compare(report, json.load(f), pytestconfig.getoption("--bench-threshold"))
+    bench.save_json(bench.RESULTS_PATH, report)
+    assert report["regressions"] == []
+
+def test_compare_flags_regressions():
+    base = {"results": [{"backend": "tiled", "integrator": "leapfrog", "N": 100, "steps_per_s": 100.0, "peak_bytes": 1000}]}
+    cur = {"results": [{"backend": "tiled", "integrator": "leapfrog", "N": 100, "steps_per_s": 70.0, "peak_bytes": 1100}]}
+    regs = bench.compare(cur, base, threshold=0.25)
+    assert [r["metric"] for r in regs] == ["steps_per_s"]
+    assert bench.compare(cur, base, threshold=0.35) == []
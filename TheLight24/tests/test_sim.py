@@ -0,0 +1,528 @@
+import numpy as np
+import pytest
+from src.sim.physics_core import PhysicsCore, PhysicsConfig
+from src.sim.universe import Universe
+
+def _cloud(n, seed=0):
+    rng = np.random.default_rng(seed)
+    pos = rng.normal(size=(n,3)) * 1e6
+    vel = rng.normal(size=(n,3)) * 10.0
+    mass = rng.uniform(1.0, 2.0, n) * 1e20
+    charge = rng.choice([-1.0, 1.0], n) * 1e-3
+    return pos, vel, mass, charge
+
+def _rel_err(F, ref):
+    return np.linalg.norm(F - ref, axis=1) / np.linalg.norm(ref, axis=1)
+
+def _direct(pos, vel, mass, charge, **kw):
+    cfg = PhysicsConfig(solver="direct", **kw)
+    return PhysicsCore(pos, vel, mass, charge, cfg)._forces(pos, vel)
+
+def test_tiled_matches_direct():
+    pos, vel, mass, charge = _cloud(300)
+    kw = dict(coulomb=True, yukawa=True, yukawa_lambda=1e6, yukawa_alpha=1e20)
+    ref = _direct(pos, vel, mass, charge, **kw)
+    # a righe come il diretto: 1e-12; simmetrico (-F sparso per colonne, altro ordine di somma):
+    # tolleranza propria
+    for symmetric, tol in ((False, 1e-12), (True, 1e-10)):
+        cfg = PhysicsConfig(tile_size=37, symmetric=symmetric, **kw)
+        tiled = PhysicsCore(pos, vel, mass, charge, cfg)
+        assert np.max(_rel_err(tiled._forces(pos, vel), ref)) < tol
+
+def test_barnes_hut_matches_direct():
+    pos, vel, mass, charge = _cloud(500)
+    ref = _direct(pos, vel, mass, charge, coulomb=True)
+    bh = PhysicsCore(pos, vel, mass, charge, PhysicsConfig(coulomb=True, solver="bh", theta=0.3))
+    assert np.median(_rel_err(bh._forces(pos, vel), ref)) < 1e-3
+
+def test_barnes_hut_neutral_plasma_and_theta_limit():
+    from src.sim.barnes_hut import Octree
+    from src.sim.generators import plasma_box
+    s = plasma_box(1000, seed=1)
+    cfg = dict(grav=False, coulomb=True, softening=1e-3)
+    ref = _direct(s["pos"], s["vel"], s["mass"], s["charge"], **cfg)
+    bh = PhysicsCore(s["pos"], s["vel"], s["mass"], s["charge"], PhysicsConfig(solver="bh", theta=0.5, **cfg))
+    # cariche +/- in monopoli separati: le celle neutre conservano il dipolo
+    assert np.median(_rel_err(bh._forces(s["pos"], s["vel"]), ref)) < 0.025
+    with pytest.raises(ValueError):
+        PhysicsCore(s["pos"], s["vel"], s["mass"], s["charge"], PhysicsConfig(solver="bh", theta=1.2))
+    # anche oltre il limite l'albero non approssima la cella che contiene il bersaglio
+    F = Octree(s["pos"], s["mass"], s["charge"]).forces(theta=1.5, softening=1e-3)
+    assert np.max(_rel_err(F, _direct(s["pos"], s["vel"], s["mass"], s["charge"], softening=1e-3))) < 3.0
+
+def test_scenario_physics_block():
+    U = Universe()
+    U.load_from_json("src/sim/scenarios/plasma_box.json")
+    assert U.cfg.coulomb and not U.cfg.grav
+    assert U.cfg.solver == "tiled"
+    U.step()
+    assert U.t > 0
+
+def _kepler_energy(c):
+    from src.sim.units import G_SI
+    dx = c.pos[1] - c.pos[0]
+    r = np.sqrt(dx @ dx + c.cfg.softening**2)
+    return 0.5*np.sum(c.mass * np.sum(c.vel**2, axis=1)) - G_SI*c.mass[0]*c.mass[1]/r
+
+def test_symplectic_integrators_conserve_energy():
+    import json
+    with open("src/sim/scenarios/solar_system_min.json", encoding="utf-8") as f:
+        d = json.load(f)
+    # 10 anni con dt = 1 giorno: errore limitato, nessuna deriva secolare
+    for integrator, tol in (("leapfrog", 1e-7), ("yoshida4", 1e-10)):
+        cfg = PhysicsConfig(integrator=integrator, **d["physics"])
+        c = PhysicsCore(d["pos"], d["vel"], d["mass"], None, cfg)
+        E0 = _kepler_energy(c)
+        err = 0.0
+        for _ in range(3650):
+            c.step(86400.0)
+            err = max(err, abs(_kepler_energy(c) - E0) / abs(E0))
+        assert err < tol
+
+def test_leapfrog_drag_is_exact_decay():
+    cfg = PhysicsConfig(grav=False, drag=True, drag_gamma=0.5, integrator="leapfrog")
+    c = PhysicsCore([[0,0,0],[1e9,0,0]], [[1,0,0],[0,0,0]], [1.0, 1.0], None, cfg)
+    for _ in range(10):
+        c.step(0.1)
+    assert np.isclose(c.vel[0,0], np.exp(-0.5))
+
+def test_block_timesteps_follow_fast_pair():
+    from src.sim.units import G_SI
+    rng = np.random.default_rng(3)
+    N, M, a = 60, 1e26, 1e6
+    pos = rng.normal(size=(N,3)) * 1e9
+    vel = rng.normal(size=(N,3))
+    mass = np.full(N, 1e20)
+    pos[0], pos[1] = [a,0,0], [-a,0,0]
+    mass[:2] = M
+    vel[0] = [0, np.sqrt(G_SI*M/(4*a)), 0]
+    vel[1] = -vel[0]
+    P = 2*np.pi*a / vel[0,1]
+
+    ref = PhysicsCore(pos, vel, mass, None, PhysicsConfig(integrator="leapfrog"))
+    for _ in range(2000):
+        ref.step(P/1000)
+    cfg = PhysicsConfig(integrator="block", block_dt=P, block_levels=10, block_eta=0.01)
+    blk = PhysicsCore(pos, vel, mass, None, cfg)
+    blk.step(); blk.step()
+    # la coppia stretta scende ai bin fini, il resto resta sul passo del blocco
+    assert blk._block_n[:2].max() < 4 and blk._block_n[2:].min() == 512
+    assert np.abs(blk.pos - ref.pos).max() < 1e-2 * a
+
+def test_min_separation_matches_brute_force():
+    from src.sim.spatial import min_separation
+    rng = np.random.default_rng(5)
+    clouds = [
+        rng.normal(size=(800,3)),
+        np.vstack([rng.normal(size=(500,3))*1e-4, rng.uniform(-100, 100, size=(300,3))]),
+        np.vstack([np.zeros((4,3)), rng.normal(size=(50,3))]),   # coincidenti ignorate
+    ]
+    for pos in clouds:
+        d = np.linalg.norm(pos[None,:,:] - pos[:,None,:], axis=-1)
+        assert np.isclose(min_separation(pos), d[d > 0].min(), rtol=1e-12)
+
+def _scenario(tmp_path, name, **physics):
+    import json
+    with open(f"src/sim/scenarios/{name}", encoding="utf-8") as f:
+        d = json.load(f)
+    d["physics"].update(physics)
+    p = tmp_path / name
+    p.write_text(json.dumps(d), encoding="utf-8")
+    return str(p)
+
+def test_mixed_precision_matches_float64(tmp_path):
+    snaps = {}
+    for precision in ("float64", "mixed"):
+        U = Universe()
+        U.load_from_json(_scenario(tmp_path, "solar_system_min.json", precision=precision, integrator="leapfrog"))
+        for _ in range(100):
+            U.step(86400.0)
+        snaps[precision] = U.snapshot()
+    assert snaps["mixed"]["t"] == snaps["float64"]["t"]
+    a, b = np.array(snaps["mixed"]["pos"]), np.array(snaps["float64"]["pos"])
+    assert np.abs(a - b).max() < 1e-5 * np.abs(b).max()
+    assert np.allclose(snaps["mixed"]["mass"], snaps["float64"]["mass"])
+
+def test_worker_pool_matches_serial():
+    pos, vel, mass, charge = _cloud(200)
+    kw = dict(coulomb=True, integrator="rk4")
+    ref = PhysicsCore(pos, vel, mass, charge, PhysicsConfig(**kw))
+    par = PhysicsCore(pos, vel, mass, charge, PhysicsConfig(workers=2, **kw))
+    try:
+        for _ in range(2):
+            ref.step(1.0)
+            par.step(1.0)
+        assert np.allclose(par.pos, ref.pos, rtol=1e-12, atol=0.0)
+        # potenziale sommato dalle fette dei worker (k1 di rk4, stato di inizio passo)
+        from src.sim.diagnostics import potential_energy
+        p0 = par.pos
+        par.want_potential = True
+        par.step(1.0)
+        assert par._pot_pos is p0 and par._pot_vel is not None
+        assert np.isclose(par._pot, potential_energy(p0, mass, charge, par.cfg), rtol=1e-12)
+        # configurazione cambiata dopo l'avvio del pool: i worker la ricevono
+        for c in (ref, par):
+            c.cfg.softening = 1e5
+            c.cfg.solver = "bh"
+        F = par._conservative_forces(par.pos)
+        assert np.allclose(F, ref._conservative_forces(par.pos), rtol=1e-12, atol=0.0)
+    finally:
+        par.close()
+
+def test_yukawa_cutoff_uses_verlet_list():
+    rng = np.random.default_rng(2)
+    N = 600
+    pos = rng.uniform(0, 500.0, size=(N,3))
+    vel = rng.normal(size=(N,3)) * 0.02
+    kw = dict(grav=False, yukawa=True, yukawa_lambda=10.0, yukawa_alpha=1e-3, softening=1.0)
+    ref = PhysicsCore(pos, vel, np.ones(N), None, PhysicsConfig(**kw))._forces(pos, vel)
+    cut = PhysicsCore(pos, vel, np.ones(N), None, PhysicsConfig(yukawa_rcut=8.0, integrator="leapfrog", **kw))
+    err = np.linalg.norm(cut._forces(pos, vel) - ref, axis=1)
+    assert err.max() < 1e-3 * np.linalg.norm(ref, axis=1).max()
+    for _ in range(10):
+        cut.step(1.0)
+    # spostamenti < skin/2: la lista costruita al primo passo è ancora valida
+    assert cut._nlist.builds == 1
+
+def test_particle_mesh_periodic():
+    rng = np.random.default_rng(4)
+    N = 2000
+    # ammasso compatto al centro del box: le immagini periodiche sono trascurabili
+    pos = 0.5 + rng.normal(size=(N,3)) * 0.05
+    vel = rng.normal(size=(N,3)) * 1e-6
+    kw = dict(softening=0.01, box_size=1.0)
+    ref = PhysicsCore(pos, vel, np.ones(N), None, PhysicsConfig(**kw))._forces(pos, vel)
+    pm = PhysicsCore(pos, vel, np.ones(N), None, PhysicsConfig(solver="pm", pm_mesh=64, periodic=True, **kw))
+    assert np.median(_rel_err(pm._forces(pos, vel), ref)) < 0.1
+    pm.pos[0] = [1.2, -0.1, 0.5]
+    pm.invalidate()
+    pm.step(1.0)
+    assert pm.pos.min() >= 0.0 and pm.pos.max() < 1.0
+    # solver non periodici: dopo il riavvolgimento l'accelerazione in cache va ricalcolata
+    for solver in ("pm", "tiled", "direct", "bh"):
+        c = PhysicsCore(pos[:200], vel[:200], np.ones(200), None,
+                        PhysicsConfig(solver=solver, pm_mesh=32, periodic=True, integrator="leapfrog", **kw))
+        c.pos[0] = [1.2, -0.1, 0.5]
+        c.invalidate()
+        c.step(1e-3)
+        fresh = c._conservative_forces(c.pos) / c.mass[:,None]
+        assert np.allclose(c._current_accel(), fresh, rtol=1e-9, atol=0)
+
+def test_ensemble_matches_single_universes():
+    import json
+    from src.sim.ensemble import Ensemble
+    path = "src/sim/scenarios/plasma_box.json"
+    with open(path, encoding="utf-8") as f:
+        d = json.load(f)
+    E = Ensemble.from_json(path, softening=[5.0, 10.0, 20.0], drag_gamma=[0.0, 1e-4, 1e-2])
+    for _ in range(20):
+        E.step(0.05)
+    for k in range(E.M):
+        cfg = E.member_config(k)
+        cfg.integrator = "leapfrog"
+        c = PhysicsCore(d["pos"], d["vel"], d["mass"], d["charge"], cfg)
+        for _ in range(20):
+            c.step(0.05)
+        assert np.allclose(E.pos[k], c.pos, rtol=1e-12, atol=1e-12)
+        assert np.allclose(E.vel[k], c.vel, rtol=1e-12, atol=1e-12)
+    # dt adattivo per membro: i membri più veloci fanno più passi, tutti arrivano a t_end
+    vel = np.array(d["vel"])[None] * np.array([1.0, 10.0, 100.0])[:, None, None]
+    E = Ensemble(d["pos"], vel, d["mass"], d["charge"], E.cfg)
+    steps = E.advance(20.0)
+    assert np.all(E.t == 20.0) and steps[0] < steps[1] < steps[2]
+
+def test_collisions_merge_and_conserve():
+    rng = np.random.default_rng(6)
+    N = 3000
+    pos = rng.uniform(0, 50.0, size=(N,3))
+    pos[1] = pos[0] + [0.05, 0.0, 0.0]     # coppia sovrapposta sicura
+    vel = rng.normal(size=(N,3))
+    mass = rng.uniform(1.0, 2.0, N) * 1e3
+    charge = rng.normal(size=N)
+    cfg = PhysicsConfig(grav=False, collisions=True, collision_radius=0.05, integrator="leapfrog")
+    c = PhysicsCore(pos, vel, mass, charge, cfg)
+    c.step(0.01)
+    assert c.merged > 0 and c.N == N - c.merged and c.pos.shape == (c.N, 3)
+    assert np.isclose(c.mass.sum(), mass.sum(), rtol=1e-14)
+    assert np.isclose(c.charge.sum(), charge.sum(), rtol=1e-12)
+    assert np.allclose((c.mass[:,None]*c.vel).sum(axis=0), (mass[:,None]*vel).sum(axis=0), rtol=1e-12, atol=1e-9)
+
+def test_diagnostics_reuse_force_pass(tmp_path):
+    from src.sim.diagnostics import potential_energy
+    pos, vel, mass, charge = _cloud(200)
+    c = PhysicsCore(pos, vel, mass, charge, PhysicsConfig(coulomb=True, symmetric=False, tile_size=37))
+    c.want_potential = True
+    c._forces(pos, vel)
+    assert np.isclose(c._pot, potential_energy(pos, mass, charge, c.cfg), rtol=1e-12)
+
+    U = Universe()
+    U.load_from_json(_scenario(tmp_path, "solar_system_min.json", diag_every=10, integrator="leapfrog"))
+    assert U.diagnostics() is None
+    for _ in range(100):
+        U.step(86400.0)
+    d = U.diagnostics()
+    assert d["step"] == 100 and d["potential_source"] == "force-pass"
+    assert d["potential"] < 0 < d["kinetic"] and abs(d["dE_rel"]) < 1e-7
+
+    # ogni solver e integratore: potenziale dal passo stesso, mai ricalcolato;
+    # rk4 campiona lo stato di inizio passo (k1), gli altri quello di fine passo
+    from src.sim.diagnostics import Diagnostics
+    for solver, integrator in (("tiled", "rk4"), ("direct", "leapfrog"), ("bh", "rk4"),
+                               ("bh", "leapfrog"), ("tiled", "block")):
+        b = PhysicsCore(pos, vel, mass, charge, PhysicsConfig(coulomb=True, solver=solver, theta=0.3,
+                                                              integrator=integrator, block_dt=1e-4))
+        D = Diagnostics(every=1)
+        D.before_step(b, 2.0)
+        b.step(1e-4)
+        D.after_step(b, 2.0 + 1e-4)
+        d = D.latest()
+        pre = integrator == "rk4"
+        ref = potential_energy(pos if pre else b.pos, mass, charge, c.cfg)
+        assert d["potential_source"] == "force-pass" and np.isclose(d["potential"], ref, rtol=1e-2)
+        assert d["t"] == (2.0 if pre else 2.0 + 1e-4) and d["step"] == (0 if pre else 1)
+        assert np.isclose(d["kinetic"], 0.5*np.sum(mass[:,None]*(vel if pre else b.vel)**2), rtol=1e-12)
+
+    # PM: potenziale periodico dalla mesh, lo stesso ricalcolato fuori dal passo; energia conservata
+    rng = np.random.default_rng(4)
+    N = 500
+    p = PhysicsCore(0.5 + rng.normal(size=(N,3))*0.15, np.zeros((N,3)), np.ones(N), None,
+                    PhysicsConfig(solver="pm", periodic=True, box_size=1.0, pm_mesh=32, softening=0.02,
+                                  integrator="leapfrog"))
+    p.G = 1.0
+    D = Diagnostics(every=10)
+    for _ in range(100):
+        D.before_step(p)
+        p.step(5e-5)
+        D.after_step(p, 0.0)
+    d = D.latest()
+    assert d["potential_source"] == "force-pass" and d["kinetic"] > 0.3 * -d["potential"]
+    assert max(abs(s["dE_rel"]) for s in D.samples) < 2e-3
+    p.invalidate()
+    m = Diagnostics().measure(p, 0.0)
+    assert m["potential_source"] == "mesh" and np.isclose(m["potential"], d["potential"], rtol=1e-12)
+
+def test_checkpoint_roundtrip(tmp_path):
+    U = Universe()
+    U.load_from_json(_scenario(tmp_path, "solar_system_min.json", precision="mixed", integrator="leapfrog", diag_every=5))
+    for _ in range(10):
+        U.step(86400.0)
+    ck = str(tmp_path / "state.npz")
+    U.save_checkpoint(ck)
+    V = Universe()
+    V.load_checkpoint(ck)
+    assert V.t == U.t and V.dt_last == U.dt_last and V.cfg.precision == "mixed"
+    for _ in range(10):
+        U.step(86400.0)
+        V.step(86400.0)
+    # stesso stato interno e stesso clock: continuazione identica
+    assert np.array_equal(V.core.pos, U.core.pos) and np.array_equal(V.core.vel, U.core.vel)
+    assert V.snapshot() == U.snapshot() and V.diagnostics() == U.diagnostics()
+
+def test_trajectory_recorder_replay(tmp_path):
+    from src.sim.trajectory import TrajectoryReader
+    U = Universe()
+    U.load_from_json("src/sim/scenarios/plasma_box.json")
+    path = str(tmp_path / "traj.npy")
+    rec = U.record(path, capacity=4, stride=3)
+    for _ in range(12):
+        U.step(0.01)
+    assert rec.count == 4 and rec.dropped == 1
+    U.stop_recording()
+    R = TrajectoryReader(path)
+    assert len(R) == 4
+    f = R.frame(2)
+    assert np.isclose(f["t"], 0.06) and f["pos"].dtype == np.float32 and f["pos"].shape == (6, 3)
+    assert np.isclose(R.frame(0)["t"], 0.0) and np.isclose(R.frame(3)["t"], 0.09)
+
+def test_generators_and_binary_scenarios(tmp_path):
+    import json
+    from src.sim.generators import plummer, lattice
+    from src.sim.diagnostics import kinetic_energy, potential_energy
+    s = plummer(2000, seed=1, total_mass=1e30, a=1e11)
+    assert np.array_equal(s["pos"], plummer(2000, seed=1, total_mass=1e30, a=1e11)["pos"])
+    # equilibrio viriale: 2T/|U| ~ 1
+    U = potential_energy(s["pos"], s["mass"], s["charge"], PhysicsConfig(softening=0.0))
+    assert abs(2*kinetic_energy(s["vel"], s["mass"]) / abs(U) - 1.0) < 0.1
+    assert len(np.unique(lattice(1000)["pos"], axis=0)) == 1000
+
+    spec = {"physics": {"integrator": "leapfrog"},
+            "generator": {"type": "plasma_box", "n": 500, "seed": 2, "temperature": 1e4}}
+    p = tmp_path / "gen.json"
+    p.write_text(json.dumps(spec), encoding="utf-8")
+    A = Universe()
+    A.load(str(p))
+    assert A.core.N == 500 and A.cfg.integrator == "leapfrog"
+    c = A.core
+    np.savez(tmp_path / "s.npz", pos=c.pos, vel=c.vel, mass=c.mass, charge=c.charge,
+             physics=json.dumps(spec["physics"]))
+    np.save(tmp_path / "s.npy", np.hstack([c.pos, c.vel, c.mass[:,None], c.charge[:,None]]))
+    for name in ("s.npz", "s.npy"):
+        B = Universe()
+        B.load(str(tmp_path / name))
+        assert np.array_equal(B.core.pos, c.pos) and np.array_equal(B.core.charge, c.charge)
+    # dalla cache: copie indipendenti
+    B.load(str(p))
+    B.core.pos[0] = 1e9
+    assert not np.array_equal(B.core.pos, c.pos) and A.core.pos[0,0] != 1e9
+    # input non valido: ValueError (400 dall'API), non TypeError/KeyError
+    bad = [{"generator": {"type": "plummer", "n": 10, "radius": 2.0}},
+           {"generator": {"type": "lattice"}},
+           {"pos": [[0, 0, 0]], "vel": [[0, 0, 0]]},
+           {"pos": [[0, 0, 0]], "vel": [[0, 0]], "mass": [1.0]}]
+    for k, d in enumerate(bad):
+        q = tmp_path / f"bad{k}.json"
+        q.write_text(json.dumps(d), encoding="utf-8")
+        with pytest.raises(ValueError):
+            Universe().load(str(q))
+    bad = [dict(pos=c.pos, vel=c.vel[:, :2], mass=c.mass),
+           dict(pos=c.pos, vel=c.vel, mass=c.mass, charge=c.charge[:10]),
+           dict(pos=c.pos, vel=c.vel)]
+    for k, d in enumerate(bad):
+        q = tmp_path / f"bad{k}.npz"
+        np.savez(q, **d)
+        with pytest.raises(ValueError):
+            Universe().load(str(q))
+
+def test_profiler_counts_phases(tmp_path):
+    U = Universe()
+    U.load_from_json(_scenario(tmp_path, "plasma_box.json", integrator="leapfrog"))
+    U.step(0.01)
+    assert U.prof.report()["phases"] == {}      # disattivato: nessuna registrazione
+    U.prof.enabled = True
+    for _ in range(10):
+        U.step(0.01)
+    r = U.prof.report()
+    # leapfrog: una valutazione di forze per passo (la prima è in cache dallo step precedente)
+    assert r["counts"]["force_evals"] == 10 and r["counts"]["force_rows"] == 60
+    assert r["phases"]["step"]["calls"] == 10 and r["phases"]["forces"]["calls"] == 10
+    assert r["phases"]["universe.step"]["p99_s"] >= r["phases"]["universe.step"]["p50_s"] > 0
+    assert r["bytes"]["forces"]["max"] > 0
+
+def test_runner_background_and_double_buffer(tmp_path):
+    import time
+    from src.sim.runner import SimRunner
+    U = Universe()
+    U.load_from_json(_scenario(tmp_path, "plasma_box.json", integrator="leapfrog"))
+    R = SimRunner(U, rate=0.0, dt=0.01)
+    f0 = R.frame()
+    R.run()
+    deadline = time.time() + 5.0
+    while R.steps < 20 and time.time() < deadline:
+        time.sleep(0.01)
+    R.pause()
+    steps, t = R.steps, U.t
+    time.sleep(0.05)
+    assert steps >= 20 and R.steps == steps and U.t == t      # in pausa non avanza
+    assert np.isclose(t, 0.01 * steps)
+    f1 = R.frame()
+    assert f1["t"] == t and np.array_equal(f1["pos"], U.core.pos)
+    assert f0["t"] == 0.0 and not np.array_equal(f0["pos"], f1["pos"])  # frame pubblicati immutati
+    R.run(rate=50.0)
+    time.sleep(0.2)
+    R.close()
+    assert 0 < R.steps - steps < 30
+    # pause() mentre il thread attende il lock: nessun passo dopo il rilascio
+    steps, t = R.steps, U.t
+    with R.lock:
+        R.run(rate=0.0)
+        time.sleep(0.05)
+        R.pause()
+    time.sleep(0.05)
+    R.close()
+    assert R.steps == steps and U.t == t
+
+def test_advance_many_steps_and_until_t(tmp_path):
+    from src.sim.runner import SimRunner
+    U = Universe()
+    U.load_from_json(_scenario(tmp_path, "plasma_box.json", integrator="leapfrog"))
+    s = U.advance(steps=7, dt=0.01).as_dict()
+    assert s["steps"] == 7 and s["dt_min"] == s["dt_max"] == 0.01 and np.isclose(U.t, 0.07)
+    s = U.advance(until_t=0.1, dt=0.02).as_dict()     # 0.09, 0.1 (ultimo passo accorciato)
+    assert s["steps"] == 2 and U.t == 0.1 and np.isclose(s["dt_min"], 0.01)
+    assert U.advance(until_t=0.1).steps == 0
+    R = SimRunner(U)
+    progress = list(R.advance(steps=25, dt=0.01, every=10))
+    assert [p["steps"] for p in progress] == [10, 20, 25] and [p["done"] for p in progress] == [False, False, True]
+    assert np.isclose(R.frame()["t"], 0.35)
+    progress = list(R.advance(until_t=0.4, every=1000))     # dt adattivo
+    assert len(progress) == 1 and progress[0]["t"] == 0.4 and progress[0]["done"]
+
+def test_session_registry_evicts_and_revives(tmp_path):
+    from src.sim.sessions import SessionRegistry, SessionLimitError
+    path = _scenario(tmp_path, "plasma_box.json", integrator="leapfrog")
+    reg = SessionRegistry(str(tmp_path / "sessions"), max_sessions=1, max_particles=10)
+    try:
+        a = reg.get("a")
+        a.load(path)
+        reg.admit("a")
+        for _ in a.advance(steps=5, dt=0.01):
+            pass
+        progress = a.advance(steps=3, dt=0.01, every=1)
+        assert a.busy and a.frame()["t"] >= 0.06    # frame pubblicato, senza il lock dei comandi
+        progress.close()            # mai iterato (client già disconnesso): la sessione si libera
+        assert not a.busy and np.isclose(a.frame()["t"], 0.08)
+        for _ in a.advance(steps=2, dt=0.01, every=1):
+            break                   # interrotto dopo il primo messaggio
+        assert not a.busy
+        a.load(path)
+        for _ in a.advance(steps=5, dt=0.01):
+            pass
+        pos = a.frame()["pos"]
+        b = reg.get("b")            # oltre max_sessions: "a" sospesa su checkpoint
+        assert a.closed and reg.status()["suspended"] == ["a"]
+        b.load(path)
+        a = reg.get("a")            # ripresa trasparente (sospende "b")
+        f = a.frame()
+        assert np.isclose(f["t"], 0.05) and np.array_equal(f["pos"], pos)
+        assert reg.evictions == 2 and reg.revivals == 1
+        a.running = True            # in cache da un run() precedente, runner ormai fermo
+        b = reg.get("b")            # ripresa; stato chiesto al worker: "a" resta sospendibile
+        assert a.closed and reg.status()["suspended"] == ["a"]
+        progress = b.advance(steps=3, dt=0.01, every=1)
+        with pytest.raises(SessionLimitError):
+            reg.get("a")            # "b" ha una richiesta in corso: il suo lock non è libero
+        progress.close()
+        a = reg.get("a")
+        assert b.closed and np.isclose(a.frame()["t"], 0.05) and reg.revivals == 3
+        reg.max_particles = 3
+        with pytest.raises(SessionLimitError):
+            reg.admit("a")          # la sola sessione supera il limite di particelle
+        assert "a" not in reg.status()["live"]
+    finally:
+        reg.close()
+
+def test_binary_snapshot_roundtrip(tmp_path):
+    from src.sim import wire
+    U = Universe()
+    U.load_from_json(_scenario(tmp_path, "plasma_box.json"))
+    U.step(0.01)
+    f = U.frame()
+    d = wire.decode(wire.encode(f, dtype="float64"))
+    assert d["t"] == f["t"] and d["N"] == f["N"]
+    assert all(np.array_equal(d[k], f[k]) for k in ("pos", "vel", "mass"))
+    raw = wire.encode(f, wire.parse_fields("vel,pos"), "float32", max_particles=4)
+    assert len(raw) == wire.HEADER.size + 4*6*4
+    d = wire.decode(raw)
+    assert "mass" not in d and d["pos"].dtype == np.dtype("<f4")
+    assert np.allclose(d["pos"], f["pos"][:4], rtol=1e-6)
+    with pytest.raises(ValueError):
+        wire.parse_fields("pos,spin")
+
+def test_stream_quantized_keyframes_and_deltas():
+    from src.sim.stream import StreamEncoder, StreamDecoder, HEADER, BOX
+    rng = np.random.default_rng(3)
+    pos = rng.uniform(-1.0, 1.0, size=(500, 3))
+    enc, dec = StreamEncoder(keyframe_every=4), StreamDecoder()
+    kinds = []
+    for k in range(8):
+        msg = enc.encode(pos, t=0.1*k)
+        m = dec.feed(msg)
+        kinds.append(m["keyframe"])
+        span = 2.0 * 1.1
+        assert np.abs(m["pos"] - pos).max() <= span / 65535       # errore di quantizzazione, non accumulato
+        size = 2*pos.size + BOX.size if m["keyframe"] else pos.size   # uint16 + box / int8
+        assert len(msg) == HEADER.size + size
+        pos = pos + 1e-4 * rng.normal(size=pos.shape)
+    assert kinds == [True, False, False, False, False, True, False, False]
+    pos[0] = 5.0                                                   # fuori dal box: keyframe
+    assert dec.feed(enc.encode(pos, 0.8))["keyframe"]
@@ -1,9 +1,11 @@
 import os, sys, pytest
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "build"))
 
-@pytest.mark.skipif("physics_core" not in __import__("sys").modules and
-                    __import__("importlib").util.find_spec("physics_core") is None,
-                    reason="Modulo physics_core non trovato. Esegui la build in /build")
+needs_build = pytest.mark.skipif("physics_core" not in __import__("sys").modules and
+                                 __import__("importlib").util.find_spec("physics_core") is None,
+                                 reason="Modulo physics_core non trovato. Esegui la build in /build")
+
+@needs_build
 def test_bindings_minimal():
     import physics_core as pc
     sim = pc.Simulator()
@@ -13,3 +15,106 @@ def test_bindings_minimal():
     sim.step(5)
     snap = sim.snapshot()
     assert "Entities=2" in snap
+
+@needs_build
+def test_native_backend_views():
+    import numpy as np
+    from src.sim.universe import Universe
+    U = Universe(backend="native")
+    with pytest.warns(RuntimeWarning):     # rk4 di default -> Eulero semi-implicito nativo
+        U.load_from_json("src/sim/scenarios/plasma_box.json")
+    pos = U.core.pos
+    assert pos.shape == (6, 3) and np.shares_memory(pos, U.core.sim.pos)
+    # riferimento NumPy: stesse forze, Eulero semi-implicito con drag esatto
+    V = Universe()
+    V.load_from_json("src/sim/scenarios/plasma_box.json")
+    c = V.core
+    for _ in range(50):
+        U.step(0.01)
+        c.vel = c.vel + 0.01 * c._conservative_forces(c.pos) / c.mass[:,None]
+        c.pos = c.pos + 0.01 * c.vel
+        c.vel *= np.exp(-c.cfg.drag_gamma * 0.01 / c.mass)[:,None]
+    assert U.core.pos is pos
+    assert np.allclose(pos, c.pos, rtol=1e-12, atol=1e-12)
+
+@needs_build
+def test_native_views_block_reallocation():
+    import numpy as np
+    import physics_core as pc
+    from src.sim.native import NativeCore
+    from src.sim.physics_core import PhysicsConfig
+    s = pc.Simulator()
+    s.resize(4)
+    p = s.pos[1:]
+    with pytest.raises(BufferError):
+        s.resize(1000)      # la vista resterebbe su memoria liberata
+    with pytest.raises(BufferError):
+        s.add(pc.Entity("A", 0.0, 0.0, 1.0))
+    p[:] = 7.0
+    del p
+    s.resize(1000)
+    assert len(s) == 1000 and (s.pos[1:4] == 7.0).all()
+    # configurazioni che il kernel nativo non sa eseguire: errore, non ignorate
+    for kw in (dict(solver="bh"), dict(precision="mixed"), dict(integrator="leapfrog")):
+        with pytest.raises(ValueError):
+            NativeCore(np.zeros((2, 3)), np.zeros((2, 3)), np.ones(2), None, PhysicsConfig(**kw))
+    with pytest.warns(RuntimeWarning):
+        c = NativeCore([[0, 0, 0], [0.01, 0, 0]], np.zeros((2, 3)), np.ones(2), None,
+                       PhysicsConfig(collisions=True, softening=0.01))
+    c.step(1e-3)            # fusione: resize con le viste del core rilasciate
+    assert c.N == 1 and c.pos.shape == (1, 3) and c.mass[0] == 2.0
+
+@needs_build
+def test_native_threads_release_gil():
+    import threading, time
+    import numpy as np
+    import physics_core as pc
+    P = np.random.default_rng(1).normal(size=(3000, 3))
+    sims = []
+    for threads in (1, 3):
+        s = pc.Simulator()
+        s.resize(len(P))
+        s.pos[:] = P
+        s.walls = s.casimir = False
+        s.softening2, s.dt, s.threads = 0.01, 0.01, threads
+        sims.append(s)
+    sims[0].step(2)
+    t0 = time.perf_counter()
+    sims[1].step(1)
+    t_step = time.perf_counter() - t0
+    # un solo step lungo in un thread: il principale non deve restare fermo per tutta la sua durata
+    # (col GIL trattenuto la pausa più lunga tra due giri sarebbe ~t_step)
+    th = threading.Thread(target=sims[1].step, args=(1,))
+    last = time.perf_counter()
+    gap = 0.0
+    th.start()
+    while th.is_alive():
+        now = time.perf_counter()
+        gap, last = max(gap, now - last), now
+    th.join()
+    assert gap < 0.5 * t_step
+    assert np.allclose(sims[0].pos, sims[1].pos, rtol=1e-12, atol=1e-12)
+
+@needs_build
+def test_native_resize_waits_for_step():
+    import threading
+    import numpy as np
+    import physics_core as pc
+    s = pc.Simulator()
+    s.resize(2000)
+    s.pos[:] = np.random.default_rng(2).normal(size=(2000, 3))
+    s.walls = s.casimir = False
+    s.softening2, s.dt = 0.01, 0.01
+    th = threading.Thread(target=s.step, args=(2,))
+    th.start()
+    s.resize(2500)          # serializzato con step dallo stesso mutex: niente riallocazione a metà
+    th.join()
+    assert len(s) == 2500 and s.pos.shape == (2500, 3) and np.isfinite(s.pos).all()
+    # len e names letti mentre un altro thread rialloca: sempre su uno stato completo
+    th = threading.Thread(target=lambda: [s.resize(n) for n in range(2500, 3500, 50)])
+    th.start()
+    while th.is_alive():
+        names = s.names
+        assert len(names) % 50 == 0 and names[-1] == f"p{len(names) - 1}"
+    th.join()
+    assert s.pos.shape == (3450, 3) and len(s.names) == 3450